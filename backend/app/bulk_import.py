@@ -0,0 +1,299 @@
+"""Bulk import a local directory of images without going through HTTP.
+
+Usage:
+    python -m backend.app.bulk_import /path/to/photos --workers 8 --batch-size 64
+
+Files stream through three stages: hashing, then decoding/augmentation/
+preprocessing in a process pool, then batched CLIP inference and bulk inserts
+in this process. Files whose content hash is already in the database are
+skipped, so an interrupted import can simply be re-run.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import mimetypes
+import os
+import sys
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import select
+
+from .config import Settings, get_settings
+from .database import get_session, init_database
+from .models import Image
+from .services.storage_service import StorageService, create_storage
+from ml.clip_embedder import ClipEmbedder
+from ml.lsh import perceptual_hash
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+
+
+@dataclass
+class PreparedImage:
+    path: Path
+    content_hash: str
+    content_type: str
+    size_bytes: int
+    storage_path: str
+    width: int
+    height: int
+    perceptual_hash: str
+    pixel_values: np.ndarray  # (views, C, H, W) from ClipEmbedder.preprocess_views
+
+
+@dataclass
+class ImportStats:
+    started_at: float = field(default_factory=time.monotonic)
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        rate = self.imported / elapsed if elapsed > 0 else 0.0
+        return (
+            f"{self.imported} imported, {self.skipped} skipped, {self.failed} failed "
+            f"in {elapsed:.1f}s ({rate:.1f} images/s)"
+        )
+
+
+def create_embedder(settings: Settings) -> ClipEmbedder:
+    return ClipEmbedder(
+        settings.clip_model_name,
+        settings.clip_device,
+        use_augmentation=settings.clip_use_augmentation,
+        num_augmentations=settings.clip_num_augmentations,
+        # Only affects the version tag here: batched inference always uses every view
+        adaptive_tta=settings.clip_adaptive_tta,
+        tta_margin_threshold=settings.clip_tta_margin_threshold,
+        tta_max_views=settings.clip_tta_max_views,
+    )
+
+
+# Per-process state for the preprocessing pool
+_worker_embedder: Optional[ClipEmbedder] = None
+_worker_storage: Optional[StorageService] = None
+
+
+def _init_worker(settings: Settings) -> None:
+    global _worker_embedder, _worker_storage
+    _worker_embedder = create_embedder(settings)
+    _worker_storage = create_storage(settings)
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _prepare_file(path: Path, content_hash: str) -> PreparedImage:
+    assert _worker_embedder is not None
+    assert _worker_storage is not None
+
+    data = path.read_bytes()
+    pil_image = _worker_embedder.decode(data)
+    pixel_values = _worker_embedder.preprocess_views(pil_image)
+    storage_path = _worker_storage.upload_image(data, path.name)
+    try:
+        _worker_storage.save_thumbnails(data, content_hash)
+    except Exception as error:
+        # Not worth failing the import over; the image is served without thumbnails
+        print(f"failed to write thumbnails for {path}: {error}", file=sys.stderr)
+    return PreparedImage(
+        path=path,
+        content_hash=content_hash,
+        content_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        size_bytes=len(data),
+        storage_path=storage_path,
+        width=pil_image.width,
+        height=pil_image.height,
+        perceptual_hash=f"{perceptual_hash(data):016x}",
+        pixel_values=pixel_values,
+    )
+
+
+def iter_image_files(root: Path) -> Iterable[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if Path(filename).suffix.lower() in IMAGE_EXTENSIONS:
+                yield Path(dirpath) / filename
+
+
+async def _as_async(items: Iterable[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def _bounded_map(
+    executor: Executor,
+    fn: Callable[..., Any],
+    items: AsyncIterable[tuple],
+    window: int,
+) -> AsyncIterator[tuple[tuple, Any, Optional[BaseException]]]:
+    """Run ``fn(*args)`` in the executor with at most ``window`` calls in flight.
+
+    Yields ``(args, result, error)`` in input order, so memory stays bounded no
+    matter how many files are streamed through.
+    """
+    loop = asyncio.get_running_loop()
+    in_flight: list[tuple[tuple, asyncio.Future]] = []
+
+    async def pop_oldest() -> tuple[tuple, Any, Optional[BaseException]]:
+        args, future = in_flight.pop(0)
+        try:
+            return args, await future, None
+        except Exception as exc:
+            return args, None, exc
+
+    async for args in items:
+        in_flight.append((args, loop.run_in_executor(executor, fn, *args)))
+        if len(in_flight) >= window:
+            yield await pop_oldest()
+    while in_flight:
+        yield await pop_oldest()
+
+
+async def _load_known_hashes() -> set[str]:
+    async with get_session() as session:
+        result = await session.exec(select(Image.content_hash).where(Image.content_hash.is_not(None)))
+        return set(result.all())
+
+
+async def _write_batch(rows: list[dict[str, Any]]) -> None:
+    async with get_session() as session:
+        await session.exec(insert(Image), params=rows)
+
+
+def _to_rows(
+    batch: list[PreparedImage], analyses: list[tuple[np.ndarray, str, str]], embedding_version: str
+) -> list[dict[str, Any]]:
+    created_at = datetime.utcnow()
+    return [
+        {
+            "original_filename": prepared.path.name,
+            "content_type": prepared.content_type,
+            "size_bytes": prepared.size_bytes,
+            "content_hash": prepared.content_hash,
+            "storage_path": prepared.storage_path,
+            "width": prepared.width,
+            "height": prepared.height,
+            "created_at": created_at,
+            "embedding": embedding.tobytes(),
+            "object_category": object_category,
+            "background_category": background_category,
+            "embedding_version": embedding_version,
+            "perceptual_hash": prepared.perceptual_hash,
+        }
+        for prepared, (embedding, object_category, background_category) in zip(batch, analyses)
+    ]
+
+
+async def run_import(
+    root: Path,
+    settings: Settings,
+    workers: int,
+    batch_size: int,
+    report_interval: float,
+) -> ImportStats:
+    await init_database()
+    known_hashes = await _load_known_hashes()
+    embedder = create_embedder(settings)
+    stats = ImportStats()
+    window = max(workers * 4, batch_size * 2)
+    last_report = time.monotonic()
+
+    def report(force: bool = False) -> None:
+        nonlocal last_report
+        if force or time.monotonic() - last_report >= report_interval:
+            print(stats.summary(), file=sys.stderr, flush=True)
+            last_report = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as pool:
+        paths = _as_async((path,) for path in iter_image_files(root))
+
+        async def new_files() -> AsyncIterator[tuple[Path, str]]:
+            async for (path,), content_hash, error in _bounded_map(pool, _hash_file, paths, window):
+                if error is not None:
+                    stats.failed += 1
+                    print(f"failed to read {path}: {error}", file=sys.stderr)
+                elif content_hash in known_hashes:
+                    stats.skipped += 1
+                else:
+                    # Also dedupes identical files within this run
+                    known_hashes.add(content_hash)
+                    yield path, content_hash
+
+        write_task: Optional[asyncio.Task] = None
+
+        async def flush(batch: list[PreparedImage]) -> None:
+            nonlocal write_task
+            analyses = await asyncio.to_thread(
+                embedder.analyze_preprocessed, [prepared.pixel_values for prepared in batch]
+            )
+            # The previous batch is written while this one ran through the model
+            if write_task is not None:
+                await write_task
+            write_task = asyncio.create_task(_write_batch(_to_rows(batch, analyses, embedder.version)))
+            stats.imported += len(batch)
+            report()
+
+        batch: list[PreparedImage] = []
+        async for (path, _), prepared, error in _bounded_map(pool, _prepare_file, new_files(), window):
+            if error is not None:
+                stats.failed += 1
+                print(f"failed to prepare {path}: {error}", file=sys.stderr)
+                continue
+            batch.append(prepared)
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+        if write_task is not None:
+            await write_task
+
+    report(force=True)
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk import a directory of images")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Decode/preprocess processes")
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="Images per CLIP forward pass and per insert")
+    parser.add_argument("--report-interval", type=float, default=5.0,
+                        help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+
+    asyncio.run(
+        run_import(
+            args.directory,
+            get_settings(),
+            workers=max(1, args.workers),
+            batch_size=max(1, args.batch_size),
+            report_interval=args.report_interval,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,24 @@ class Settings(BaseSettings):
     app_name: str = "AI Image Organizer"
     database_url: str = "sqlite+aiosqlite:///./image_organizer.db"
     storage_root: Path = Path("storage")
+
+    # Thumbnails generated at ingest (local storage), longest side in pixels
+    thumbnail_sizes: list[int] = [128, 256, 512]
+    thumbnail_format: str = "webp"  # "webp" or "jpeg"
+    thumbnail_quality: int = 80
+    thumbnail_workers: int = 2
+
+    # SQLite tuning (ignored for other databases)
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268435456  # 256 MiB
+    sqlite_cache_size: int = -65536  # Negative means KiB, i.e. 64 MiB
+
+    # Group commit: coalesce inserts from concurrent uploads into one transaction
+    db_group_commit: bool = False
+    db_group_commit_max_batch: int = 64
+    db_group_commit_max_delay_ms: float = 5.0
     
     # Cloudinary settings
     use_cloudinary: bool = False
@@ -20,6 +38,24 @@ class Settings(BaseSettings):
     clip_device: str = "cpu"
     clip_use_augmentation: bool = True
     clip_num_augmentations: int = 3
+    # Adaptive TTA: score the original view first and add augmented views only
+    # while the top-1/top-2 probability margin is below the threshold
+    clip_adaptive_tta: bool = False
+    clip_tta_margin_threshold: float = 0.15
+    clip_tta_max_views: Optional[int] = None  # Hard cap on views; defaults to clip_num_augmentations
+
+    # Re-embedding when the CLIP model or TTA settings change the embedding version
+    embedding_migration_auto_start: bool = True
+    embedding_migration_batch_size: int = 32
+    embedding_migration_duty_cycle: float = 0.5  # Fraction of wall time spent embedding, the rest is left to live traffic
+
+    # Near-duplicate search: random-hyperplane LSH over embeddings
+    lsh_num_tables: int = 16  # More tables raise recall at lower thresholds
+    lsh_num_bits: int = 10  # More bits per table shrink buckets
+    lsh_refresh_interval_seconds: float = 30.0  # Background index catch-up; 0 builds it on the first request
+
+    # Embedding export: rows fetched and encoded per chunk
+    export_chunk_size: int = 5000
     
     # Clustering settings
     clustering_method: str = "hdbscan"  # "hdbscan" or "kmeans"
@@ -28,6 +64,16 @@ class Settings(BaseSettings):
     hdbscan_min_cluster_size: int = 2
     hdbscan_min_samples: Optional[int] = None
 
+    # Metrics exposed at /metrics (recording is skipped entirely when disabled)
+    metrics_enabled: bool = True
+
+    # Background ingest job settings
+    job_spool_root: Path = Path("job_spool")
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_retry_delay_seconds: float = 5.0
+    job_poll_interval_seconds: float = 2.0
+
     class Config:
         env_file = ".env"
 
@@ -15,5 +15,17 @@ def get_image_service(request: Request):
     return request.app.state.image_service
 
 
+def get_job_queue(request: Request):
+    return request.app.state.job_queue
+
+
+def get_duplicate_service(request: Request):
+    return request.app.state.duplicate_service
+
+
+def get_embedding_migrator(request: Request):
+    return request.app.state.embedding_migrator
+
+
 def get_settings(request: Request):
     return request.app.state.settings
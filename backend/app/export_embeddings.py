@@ -0,0 +1,80 @@
+"""Export every embedding with its id and categories, without going through HTTP.
+
+Usage:
+    python -m backend.app.export_embeddings embeddings.parquet
+    python -m backend.app.export_embeddings embeddings.arrows --format arrow
+    python -m backend.app.export_embeddings embeddings.zip --format npy --version openai/clip-vit-base-patch32:views=3
+
+Rows stream from a database cursor in chunks, so memory use does not grow
+with the number of images. The npy format writes a zip holding
+``embeddings.npy`` and a ``metadata.csv`` sidecar mapping rows to image ids.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional
+
+from .config import Settings, get_settings
+from .database import get_session, init_database
+from .services.export_service import EXPORT_FORMATS, EmbeddingExporter
+from .services.migration_service import LEGACY_EMBEDDING_VERSION, load_active_version
+
+SUFFIX_FORMATS = {".npy": "npy", ".zip": "npy", ".arrow": "arrow", ".arrows": "arrow", ".parquet": "parquet"}
+
+
+async def run_export(
+    output: Path, export_format: str, settings: Settings, version: Optional[str], all_versions: bool
+) -> int:
+    await init_database()
+    exporter = EmbeddingExporter(settings)
+    async with get_session() as session:
+        if version is None and not all_versions:
+            # Same default as the server, which serves the legacy rows until a version is recorded
+            version = await load_active_version(session) or LEGACY_EMBEDDING_VERSION
+        dims = await exporter.embedding_dims(session, version)
+    if len(dims) > 1:
+        raise ValueError(
+            f"Embeddings have different sizes ({', '.join(map(str, dims))}) and can't share one file, "
+            "export one --version at a time"
+        )
+
+    written = 0
+    with output.open("wb") as f:
+        async for chunk in exporter.export(export_format, version):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export stored embeddings as Parquet, Arrow IPC or .npy")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS,
+                        help="Defaults to the output file suffix")
+    parser.add_argument("--version", help="Embedding version to export, defaults to the active one")
+    parser.add_argument("--all-versions", action="store_true",
+                        help="Export every version; only possible while they all have the same embedding size")
+    args = parser.parse_args(argv)
+
+    export_format = args.export_format or SUFFIX_FORMATS.get(args.output.suffix.lower())
+    if export_format is None:
+        parser.error(f"Cannot infer the format from {args.output.name}, pass --format")
+    try:
+        EmbeddingExporter.check_format(export_format)
+    except ImportError as exc:
+        parser.error(str(exc))
+
+    try:
+        written = asyncio.run(
+            run_export(args.output, export_format, get_settings(), args.version, args.all_versions)
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(f"Wrote {written} bytes to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,24 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 
+from . import metrics
 from .config import get_settings
 from .database import init_database
-from .routers import clusters, images
+from .routers import clusters, export, images, jobs
+from .services.duplicate_service import DuplicateService
+from .services.group_commit import GroupCommitWriter
 from .services.image_service import ImageService
+from .services.job_service import JobQueue
+from .services.migration_service import EmbeddingMigrator
+from .static import ImmutableStaticFiles
 from ml.clip_embedder import ClipEmbedder
 from ml.clusterer import Clusterer
 
 settings = get_settings()
+metrics.REGISTRY.enabled = settings.metrics_enabled
 
 
 @asynccontextmanager
@@ -26,6 +32,10 @@ async def lifespan(app: FastAPI):
         settings.clip_device,
         use_augmentation=settings.clip_use_augmentation,
         num_augmentations=settings.clip_num_augmentations,
+        timer=metrics.clip_stage_timer if settings.metrics_enabled else None,
+        adaptive_tta=settings.clip_adaptive_tta,
+        tta_margin_threshold=settings.clip_tta_margin_threshold,
+        tta_max_views=settings.clip_tta_max_views,
     )
     clusterer = Clusterer(
         method=settings.clustering_method,
@@ -34,10 +44,60 @@ async def lifespan(app: FastAPI):
         min_cluster_size=settings.hdbscan_min_cluster_size,
         min_samples=settings.hdbscan_min_samples,
     )
+    writer = None
+    if settings.db_group_commit:
+        writer = GroupCommitWriter(
+            max_batch=settings.db_group_commit_max_batch,
+            max_delay_seconds=settings.db_group_commit_max_delay_ms / 1000,
+        )
+    image_service = ImageService(settings, embedder, clusterer, writer=writer)
+    job_queue = JobQueue(settings, image_service)
+    embedding_migrator = EmbeddingMigrator(settings, image_service)
     app.state.settings = settings
-    app.state.image_service = ImageService(settings, embedder, clusterer)
+    app.state.image_service = image_service
+    app.state.job_queue = job_queue
+    app.state.embedding_migrator = embedding_migrator
+    duplicate_service = DuplicateService(settings, image_service)
+    app.state.duplicate_service = duplicate_service
+    _register_gauges(image_service, job_queue)
     await init_database()
+    if writer is not None:
+        await writer.start()
+    await job_queue.start()
+    await embedding_migrator.start()
+    # After the migrator, so the index is built for the active version
+    await duplicate_service.start()
     yield
+    await duplicate_service.stop()
+    await embedding_migrator.stop()
+    await job_queue.stop()
+    if writer is not None:
+        await writer.stop()
+
+
+def _register_gauges(image_service: ImageService, job_queue: JobQueue) -> None:
+    """Scrape-time gauges for cache hit rates and queue depths"""
+    registry = metrics.REGISTRY
+
+    def embedder_stat(read):
+        # Read through the service so a swapped embedder is still reported
+        return lambda: read(image_service.embedder)
+
+    registry.gauge("clip_decode_cache_hits", "Decoded-image cache hits",
+                   embedder_stat(lambda e: e._load_image.cache_info().hits))
+    registry.gauge("clip_decode_cache_misses", "Decoded-image cache misses",
+                   embedder_stat(lambda e: e._load_image.cache_info().misses))
+    registry.gauge("clip_text_cache_hits", "Text prompt feature cache hits", embedder_stat(lambda e: e.text_cache_hits))
+    registry.gauge("clip_text_cache_misses", "Text prompt feature cache misses", embedder_stat(lambda e: e.text_cache_misses))
+    registry.gauge("clip_tta_images", "Images analyzed with shared TTA views", embedder_stat(lambda e: e.tta_images))
+    registry.gauge("clip_tta_views", "Views encoded by shared-view analysis", embedder_stat(lambda e: e.tta_views))
+    registry.gauge("clip_tta_skipped", "Images where adaptive TTA encoded only the original view",
+                   embedder_stat(lambda e: e.tta_skipped))
+    registry.gauge("ingest_jobs_pending", "Background ingest jobs waiting to run", lambda: job_queue.pending_count)
+    registry.gauge("ingest_jobs_running", "Background ingest jobs being processed", lambda: job_queue.running_count)
+    registry.gauge("thumbnail_queue_depth", "Thumbnail encodes waiting for a worker", image_service.thumbnail_queue_depth)
+    if image_service.writer is not None:
+        registry.gauge("group_commit_queue_depth", "Rows waiting for the group-commit writer", image_service.writer.queue_depth)
 
 
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
@@ -52,10 +112,13 @@ app.add_middleware(
 
 app.include_router(images.router)
 app.include_router(clusters.router)
+app.include_router(jobs.router)
+app.include_router(export.router)
 
-# Serve static files from storage directory (only if not using Cloudinary)
+# Serve static files from storage directory (only if not using Cloudinary).
+# Stored files are never rewritten, so they are served as immutable.
 if not settings.use_cloudinary:
-    app.mount("/storage", StaticFiles(directory=str(settings.storage_root)), name="storage")
+    app.mount("/storage", ImmutableStaticFiles(directory=str(settings.storage_root)), name="storage")
 
 
 @app.get("/")
@@ -67,8 +130,15 @@ async def root():
         "health": "/health",
         "endpoints": {
             "upload_image": "POST /images",
+            "upload_image_async": "POST /images?async=true",
+            "upload_images_batch": "POST /images/batch",
+            "job_status": "GET /jobs/{id}",
+            "embedding_migration": "GET /jobs/embedding-migration",
+            "metrics": "GET /metrics",
             "list_images": "GET /images",
-            "get_clusters": "GET /clusters"
+            "find_duplicates": "GET /images/duplicates",
+            "get_clusters": "GET /clusters",
+            "export_embeddings": "GET /export/embeddings?format=parquet|arrow|npy"
         }
     }
 
@@ -80,6 +150,12 @@ async def test_page():
     return FileResponse(test_file)
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus text exposition of the in-process metrics"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def healthcheck() -> dict[str, str]:
     return {"status": "ok"}
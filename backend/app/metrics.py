@@ -0,0 +1,212 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Metrics are defined at module level and recorded from the hot paths. When the
+registry is disabled every recording call returns before touching any state,
+so instrumentation costs a single attribute check.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from contextlib import nullcontext
+from typing import ContextManager, Optional, TypeVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NULL_CONTEXT = nullcontext()
+
+LabelValues = tuple[str, ...]
+_MetricT = TypeVar("_MetricT", bound="_Metric")
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.enabled = True
+        self._metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, tuple(labelnames)))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(self, name, help_text, tuple(labelnames), tuple(buckets)))
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], float]) -> Gauge:
+        """Gauge read from ``callback`` at scrape time, replacing any gauge of the same name"""
+        gauge = Gauge(self, name, help_text, callback)
+        self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _MetricT) -> _MetricT:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labelnames: LabelValues = ()) -> None:
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets: tuple[float, ...]) -> None:
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum]
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = self._values[key]
+            counts[index] += 1
+            total[0] += value
+
+    def time(self, **labels: str) -> ContextManager:
+        """Context manager that observes the elapsed seconds of its block"""
+        if not self.registry.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, registry, name, help_text, callback: Callable[[], float]) -> None:
+        super().__init__(registry, name, help_text)
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict[str, str]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "image_ingest_stage_seconds",
+    "Time spent in each stage of ImageService ingest",
+    ["stage"],
+)
+IMAGES_INGESTED = REGISTRY.counter("images_ingested_total", "Images ingested through ImageService")
+CLIP_STAGE_SECONDS = REGISTRY.histogram(
+    "clip_stage_seconds",
+    "Time spent in ClipEmbedder stages (forward is per view)",
+    ["stage"],
+)
+CLUSTER_STAGE_SECONDS = REGISTRY.histogram(
+    "cluster_stage_seconds",
+    "Time spent loading embeddings and clustering each (object, background) group",
+    ["stage"],
+)
+CLUSTER_GROUP_SIZE = REGISTRY.histogram(
+    "cluster_group_size",
+    "Images per clustered (object, background) group",
+    buckets=(1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+INGEST_JOBS = REGISTRY.counter("ingest_jobs_total", "Background ingest job attempts by outcome", ["status"])
+
+
+def clip_stage_timer(stage: str) -> ContextManager:
+    """Timer hook passed to ClipEmbedder"""
+    return CLIP_STAGE_SECONDS.time(stage=stage)
@@ -2,19 +2,64 @@ from datetime import datetime
 from typing import Optional
 
 from sqlmodel import Field, SQLModel
-from sqlalchemy import Column
+from sqlalchemy import Column, Index
 from sqlalchemy.types import LargeBinary
 
 
 class Image(SQLModel, table=True):
+    # Composite index also serves object-only lookups (leading column)
+    __table_args__ = (Index("ix_image_object_background", "object_category", "background_category"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     original_filename: str
     content_type: str
     size_bytes: int
+    content_hash: Optional[str] = Field(default=None, index=True)  # sha256 of the original bytes
     storage_path: str
     width: Optional[int] = None
     height: Optional[int] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     embedding: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
     object_category: Optional[str] = None  # e.g., "cat", "dog", "car"
-    background_category: Optional[str] = None  # e.g., "indoor", "outdoor"
+    background_category: Optional[str] = Field(default=None, index=True)  # e.g., "indoor", "outdoor"
+    embedding_version: Optional[str] = Field(default=None, index=True)  # ClipEmbedder.version that produced the embedding
+    perceptual_hash: Optional[str] = None  # 64-bit dHash as 16 hex digits
+    embedding_failed_version: Optional[str] = None  # Migration target this image could not be re-embedded for
+
+
+class IngestJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="pending", index=True)  # "pending", "running", "completed", "failed"
+    original_filename: str
+    content_type: str
+    spool_path: str  # Where the upload is persisted until the job completes
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    image_id: Optional[int] = Field(default=None, foreign_key="image.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    available_at: datetime = Field(default_factory=datetime.utcnow)  # Retry backoff
+
+
+class EmbeddingMigration(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    target_version: str = Field(index=True)
+    status: str = Field(default="running", index=True)  # "running", "failed", "completed", "superseded"
+    last_image_id: int = 0  # Checkpoint: images up to this id have been staged or counted as failed
+    total: int = 0  # Images needing re-embedding when the migration was created
+    processed: int = 0
+    failed: int = 0
+    error: Optional[str] = None  # Last per-image failure, or what stopped the migration
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+
+class StagedEmbedding(SQLModel, table=True):
+    """Re-computed embedding held back until its migration swaps versions"""
+    image_id: int = Field(primary_key=True, foreign_key="image.id")
+    migration_id: int = Field(foreign_key="embeddingmigration.id", index=True)
+    embedding: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    object_category: Optional[str] = None
+    background_category: Optional[str] = None
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..dependencies import get_db_session, get_image_service
-from ..schemas import CategoryGroup, ClusterInfo
+from ..schemas import CategoryGroup, CategorySummary, ClusterInfo
 from ..services.image_service import ImageService
 
 router = APIRouter(prefix="/clusters", tags=["clusters"])
@@ -14,20 +14,35 @@ router = APIRouter(prefix="/clusters", tags=["clusters"])
 
 @router.get("", response_model=List[ClusterInfo])
 async def list_clusters(
+    object_category: Optional[str] = Query(None, alias="object"),
+    background_category: Optional[str] = Query(None, alias="background"),
     service: ImageService = Depends(get_image_service),
     session: AsyncSession = Depends(get_db_session),
 ) -> List[ClusterInfo]:
-    """Get flat list of clusters (for backward compatibility)"""
-    return await service.get_clusters(session)
+    """Get flat list of clusters, optionally only for one object and/or background category"""
+    return await service.get_clusters(session, object_category, background_category)
+
+
+@router.get("/categories", response_model=List[CategorySummary])
+async def list_categories(
+    service: ImageService = Depends(get_image_service),
+    session: AsyncSession = Depends(get_db_session),
+) -> List[CategorySummary]:
+    """List (object, background) groups with image counts without clustering anything"""
+    return await service.list_categories(session)
 
 
 @router.get("/grouped", response_model=List[CategoryGroup])
 async def list_clusters_grouped(
+    object_category: Optional[str] = Query(None, alias="object"),
     service: ImageService = Depends(get_image_service),
     session: AsyncSession = Depends(get_db_session),
 ) -> List[CategoryGroup]:
-    """Get clusters grouped by object category with background subgroups"""
-    clusters = await service.get_clusters(session)
+    """Get clusters grouped by object category with background subgroups.
+
+    Pass ``object`` to fetch a single category lazily (see ``/clusters/categories``).
+    """
+    clusters = await service.get_clusters(session, object_category)
     
     # Group clusters by object category
     groups: dict[str, list[ClusterInfo]] = {}
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..config import Settings
+from ..dependencies import get_db_session, get_image_service, get_settings
+from ..services.export_service import FILE_EXTENSIONS, MEDIA_TYPES, EmbeddingExporter
+from ..services.image_service import ImageService
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get("/embeddings")
+async def export_embeddings(
+    export_format: str = Query("parquet", alias="format", pattern="^(npy|arrow|parquet)$"),
+    version: Optional[str] = Query(None, description="Embedding version to export, defaults to the active one"),
+    service: ImageService = Depends(get_image_service),
+    settings: Settings = Depends(get_settings),
+    session: AsyncSession = Depends(get_db_session),
+) -> StreamingResponse:
+    """Stream every embedding with its id and categories as Parquet, Arrow IPC or a zipped .npy + CSV"""
+    try:
+        EmbeddingExporter.check_format(export_format)
+    except ImportError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    exporter = EmbeddingExporter(settings)
+    version = version or service.active_embedding_version
+    # Checked before streaming starts; a mismatch mid-stream would truncate a 200 response
+    dims = await exporter.embedding_dims(session, version)
+    if len(dims) > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Embeddings of version {version!r} have different sizes ({', '.join(map(str, dims))}) "
+            "and can't share one file",
+        )
+
+    filename = f"embeddings.{FILE_EXTENSIONS[export_format]}"
+    return StreamingResponse(
+        exporter.export(export_format, version),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,28 +1,70 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..dependencies import get_db_session, get_image_service
-from ..schemas import ImageRead
-from ..services.image_service import ImageService
+from ..dependencies import get_db_session, get_duplicate_service, get_image_service, get_job_queue
+from ..schemas import DuplicateGroup, ImageRead, JobRead
+from ..services.duplicate_service import DuplicateService
+from ..services.image_service import ImageService, InvalidImageError
+from ..services.job_service import JobQueue
 
 router = APIRouter(prefix="/images", tags=["images"])
 
 
-@router.post("", response_model=ImageRead)
+@router.post("", response_model=ImageRead, responses={202: {"model": JobRead}})
 async def upload_image(
     file: UploadFile = File(...),
+    run_async: bool = Query(False, alias="async"),
     service: ImageService = Depends(get_image_service),
+    jobs: JobQueue = Depends(get_job_queue),
     session: AsyncSession = Depends(get_db_session),
-) -> ImageRead:
-    image = await service.ingest_image(file, session)
-    image_data = ImageRead.model_validate(image)
-    # Add image URL from storage service
-    image_data.image_url = service.storage.get_image_url(image.storage_path)
-    return image_data
+) -> Union[ImageRead, JSONResponse]:
+    if run_async:
+        # Hand the upload to the background workers and poll GET /jobs/{id}
+        job = await jobs.enqueue(file, session)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(JobRead.model_validate(job)),
+        )
+
+    try:
+        image = await service.ingest_image(file, session)
+    except InvalidImageError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # Add image and thumbnail URLs from storage service
+    return service.to_read(image)
+
+
+@router.post("/batch", response_model=List[JobRead], status_code=status.HTTP_202_ACCEPTED)
+async def upload_images_batch(
+    files: List[UploadFile] = File(...),
+    jobs: JobQueue = Depends(get_job_queue),
+    session: AsyncSession = Depends(get_db_session),
+) -> List[JobRead]:
+    """Enqueue every file as a background ingest job"""
+    result = []
+    for file in files:
+        job = await jobs.enqueue(file, session)
+        result.append(JobRead.model_validate(job))
+    return result
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroup])
+async def find_duplicates(
+    threshold: float = Query(0.95, ge=0.0, le=1.0, description="Minimum cosine similarity of a duplicate pair"),
+    max_hash_distance: Optional[int] = Query(
+        None, ge=0, le=64, description="Also require perceptual hashes within this many bits"
+    ),
+    duplicates: DuplicateService = Depends(get_duplicate_service),
+    session: AsyncSession = Depends(get_db_session),
+) -> List[DuplicateGroup]:
+    """Groups of near-identical images, found through LSH instead of comparing every pair"""
+    return await duplicates.find_duplicates(session, threshold, max_hash_distance)
 
 
 @router.get("", response_model=List[ImageRead])
@@ -31,10 +73,5 @@ async def list_images(
     session: AsyncSession = Depends(get_db_session),
 ) -> List[ImageRead]:
     images = await service.list_images(session)
-    result = []
-    for record in images:
-        image_data = ImageRead.model_validate(record)
-        # Add image URL from storage service
-        image_data.image_url = service.storage.get_image_url(record.storage_path)
-        result.append(image_data)
-    return result
+    # Add image and thumbnail URLs from storage service
+    return [service.to_read(record) for record in images]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..dependencies import get_db_session, get_embedding_migrator, get_job_queue
+from ..schemas import EmbeddingMigrationRead, JobRead
+from ..services.job_service import JobQueue
+from ..services.migration_service import MIGRATION_FAILED, MIGRATION_RUNNING, EmbeddingMigrator
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/embedding-migration", response_model=EmbeddingMigrationRead)
+async def get_embedding_migration(
+    migrator: EmbeddingMigrator = Depends(get_embedding_migrator),
+    session: AsyncSession = Depends(get_db_session),
+) -> EmbeddingMigrationRead:
+    migration = await migrator.get_status(session)
+    if migration is None:
+        raise HTTPException(status_code=404, detail="No embedding migration has run")
+    status = EmbeddingMigrationRead.model_validate(migration)
+    status.active_version = migrator.image_service.active_embedding_version
+    return status
+
+
+@router.post("/embedding-migration", response_model=EmbeddingMigrationRead, status_code=202)
+async def resume_embedding_migration(
+    migrator: EmbeddingMigrator = Depends(get_embedding_migrator),
+    session: AsyncSession = Depends(get_db_session),
+) -> EmbeddingMigrationRead:
+    """Start or resume the pending migration (when auto start is disabled or it failed)"""
+    migration = await migrator.get_status(session)
+    if migration is None or migration.status not in (MIGRATION_RUNNING, MIGRATION_FAILED):
+        raise HTTPException(status_code=409, detail="No embedding migration is pending")
+    await migrator.resume(migration.id)
+    await session.refresh(migration)
+    status = EmbeddingMigrationRead.model_validate(migration)
+    status.active_version = migrator.image_service.active_embedding_version
+    return status
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: int,
+    jobs: JobQueue = Depends(get_job_queue),
+    session: AsyncSession = Depends(get_db_session),
+) -> JobRead:
+    job = await jobs.get_job(job_id, session)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobRead.model_validate(job)
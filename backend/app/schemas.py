@@ -14,6 +14,7 @@ class ImageRead(BaseModel):
     size_bytes: int
     storage_path: str
     image_url: Optional[str] = None  # Public URL for the image
+    thumbnail_urls: dict[int, str] = {}  # Public thumbnail URLs keyed by longest side in pixels
     width: Optional[int]
     height: Optional[int]
     created_at: datetime
@@ -33,8 +34,55 @@ class ClusterInfo(BaseModel):
     image_ids: list[int]
 
 
+class CategorySummary(BaseModel):
+    """Image count for one (object, background) group, used to fetch clusters lazily"""
+    object_category: str
+    background_category: str
+    image_count: int
+
+
+class DuplicateGroup(BaseModel):
+    """Images connected by near-duplicate pairs"""
+    group_id: int
+    image_ids: list[int]
+    min_similarity: float  # Weakest pairwise cosine similarity that joined the group
+
+
 class CategoryGroup(BaseModel):
     """Groups clusters by main object category"""
     object_category: str
     total_images: int
     subgroups: list[ClusterInfo]  # Clusters grouped by background
+
+
+class JobRead(BaseModel):
+    id: int
+    status: str  # "pending", "running", "completed", "failed"
+    original_filename: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    image_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class EmbeddingMigrationRead(BaseModel):
+    id: int
+    target_version: str
+    active_version: Optional[str] = None  # Version currently served by clustering
+    status: str  # "running", "failed", "completed", "superseded"
+    total: int
+    processed: int
+    failed: int
+    last_image_id: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
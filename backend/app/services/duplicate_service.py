@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, Optional
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..config import Settings
+from ..database import get_session
+from ..models import Image
+from ..schemas import DuplicateGroup
+from ml.lsh import LSHIndex
+from .image_service import ImageService
+
+logger = logging.getLogger(__name__)
+
+CATCH_UP_CHUNK = 5_000
+
+
+class DuplicateService:
+    """Near-duplicate groups from an LSH index over the stored embeddings.
+
+    The index is only ever extended with rows newer than its id high-water
+    mark, whichever path (HTTP, background jobs, bulk import) wrote them, and
+    is rebuilt when the active embedding version changes. A background task
+    catches it up every ``lsh_refresh_interval_seconds``, starting at startup,
+    so requests only pay for rows ingested since the last refresh.
+    """
+
+    def __init__(self, settings: Settings, image_service: ImageService) -> None:
+        self.settings = settings
+        self.image_service = image_service
+        self._index: Optional[LSHIndex] = None
+        self._version: Optional[str] = None
+        self._last_id = 0
+        # Serializes catch-up and scans so the index is never read mid-update
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.settings.lsh_refresh_interval_seconds > 0:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def find_duplicates(
+        self, session: AsyncSession, threshold: float, max_hash_distance: Optional[int] = None
+    ) -> List[DuplicateGroup]:
+        async with self._lock:
+            await self._catch_up(session)
+            if self._index is None:
+                return []
+            groups = await asyncio.to_thread(self._index.duplicate_groups, threshold, max_hash_distance)
+
+        groups.sort(key=lambda group: group[0][0])
+        return [
+            DuplicateGroup(group_id=group_id, image_ids=image_ids, min_similarity=similarity)
+            for group_id, (image_ids, similarity) in enumerate(groups)
+        ]
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                async with self._lock, get_session() as session:
+                    await self._catch_up(session)
+            except Exception:
+                logger.exception("Refreshing the duplicate index failed")
+            await asyncio.sleep(self.settings.lsh_refresh_interval_seconds)
+
+    async def _catch_up(self, session: AsyncSession) -> None:
+        """Add rows ingested since the last request, rebuilding after a version swap"""
+        version = self.image_service.active_embedding_version
+        if version != self._version:
+            self._index = None
+            self._version = version
+            self._last_id = 0
+
+        # SQLite serializes writers, so ids become visible in increasing order
+        # and a high-water mark never skips a row
+        while True:
+            result = await session.exec(
+                select(Image.id, Image.embedding, Image.perceptual_hash)
+                .where(Image.id > self._last_id, Image.embedding.is_not(None), *self.image_service.version_filter())
+                .order_by(Image.id)
+                .limit(CATCH_UP_CHUNK)
+            )
+            rows = result.all()
+            if not rows:
+                return
+            embeddings = np.vstack([np.frombuffer(row.embedding, dtype=np.float32) for row in rows])
+            if self._index is None:
+                self._index = LSHIndex(
+                    embeddings.shape[1],
+                    num_tables=self.settings.lsh_num_tables,
+                    num_bits=self.settings.lsh_num_bits,
+                )
+            hashes = [int(row.perceptual_hash, 16) if row.perceptual_hash else None for row in rows]
+            await asyncio.to_thread(self._index.add, [row.id for row in rows], embeddings, hashes)
+            self._last_id = rows[-1].id
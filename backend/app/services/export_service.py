@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import tempfile
+import zipfile
+from collections.abc import AsyncIterator
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import func, or_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..config import Settings
+from ..database import get_session
+from ..models import Image
+from .migration_service import LEGACY_EMBEDDING_VERSION
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+EXPORT_FORMATS = ("npy", "arrow", "parquet")
+
+MEDIA_TYPES = {
+    "npy": "application/zip",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FILE_EXTENSIONS = {"npy": "zip", "arrow": "arrows", "parquet": "parquet"}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable file that hands written bytes back in chunks"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class EmbeddingExporter:
+    """Streams ids, categories and embeddings straight off a database cursor.
+
+    Rows are fetched ``chunk_size`` at a time from a single streamed SELECT and
+    encoded one chunk at a time, so memory stays flat however many rows are
+    exported. Because it is one statement, the export is a consistent snapshot.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.chunk_size = max(1, settings.export_chunk_size)
+
+    @staticmethod
+    def check_format(export_format: str) -> None:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}")
+        if export_format != "npy" and not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow package is not installed. Install it with: pip install pyarrow")
+
+    def export(self, export_format: str, embedding_version: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Encoded bytes of the whole export; only embeddings of ``embedding_version`` if given"""
+        self.check_format(export_format)
+        if export_format == "npy":
+            return self._export_npy(embedding_version)
+        return self._export_arrow(export_format, embedding_version)
+
+    async def embedding_dims(self, session: AsyncSession, embedding_version: Optional[str] = None) -> list[int]:
+        """Distinct embedding sizes in the export; one file can only hold one"""
+        result = await session.exec(
+            select(func.length(Image.embedding)).where(*self._filters(embedding_version)).distinct()
+        )
+        return sorted(length // 4 for length in result.all())
+
+    @staticmethod
+    def _filters(embedding_version: Optional[str]) -> list[Any]:
+        filters = [Image.embedding.is_not(None)]
+        if embedding_version == LEGACY_EMBEDDING_VERSION:
+            # Rows from before versioning, whether or not they were tagged yet
+            filters.append(or_(Image.embedding_version.is_(None), Image.embedding_version == embedding_version))
+        elif embedding_version is not None:
+            filters.append(Image.embedding_version == embedding_version)
+        return filters
+
+    async def _chunks(self, embedding_version: Optional[str], with_count: bool = False) -> AsyncIterator[list[Any]]:
+        filters = self._filters(embedding_version)
+        columns = [
+            Image.id,
+            Image.object_category,
+            Image.background_category,
+            Image.embedding_version,
+            Image.embedding,
+        ]
+        if with_count:
+            # Evaluated once inside the same statement, so it matches the rows streamed
+            columns.append(select(func.count(Image.id)).where(*filters).scalar_subquery().label("total"))
+
+        # The export gets its own session: it outlives the request handler
+        async with get_session() as session:
+            result = await session.stream(
+                select(*columns).where(*filters).order_by(Image.id).execution_options(yield_per=self.chunk_size)
+            )
+            async for partition in result.partitions(self.chunk_size):
+                yield partition
+
+    async def _export_arrow(self, export_format: str, embedding_version: Optional[str]) -> AsyncIterator[bytes]:
+        sink = _ChunkSink()
+        writer = None
+        try:
+            async for rows in self._chunks(embedding_version):
+                batch = await asyncio.to_thread(_record_batch, rows)
+                if writer is None:
+                    writer = _arrow_writer(export_format, sink, batch.schema)
+                await asyncio.to_thread(_write_batch, writer, export_format, batch)
+                yield sink.drain()
+            if writer is None:
+                # No rows: still emit a valid, empty file
+                writer = _arrow_writer(export_format, sink, _schema(None))
+        finally:
+            if writer is not None:
+                writer.close()
+        yield sink.drain()
+
+    async def _export_npy(self, embedding_version: Optional[str]) -> AsyncIterator[bytes]:
+        """Zip (stored, not compressed) of ``embeddings.npy`` and a ``metadata.csv`` sidecar.
+
+        The .npy header needs the row count and dimension up front; both come from
+        the first row. Sidecar rows are spooled to a temporary file while the
+        embeddings stream, then appended as the second member.
+        """
+        sink = _ChunkSink()
+        archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+        with tempfile.SpooledTemporaryFile(max_size=8 << 20, mode="w+", newline="") as sidecar:
+            metadata = csv.writer(sidecar)
+            metadata.writerow(["row", "id", "object_category", "background_category", "embedding_version"])
+            embeddings = None
+            row_index = 0
+            async for rows in self._chunks(embedding_version, with_count=True):
+                if embeddings is None:
+                    width = len(rows[0].embedding)
+                    embeddings = archive.open("embeddings.npy", mode="w", force_zip64=True)
+                    _write_npy_header(embeddings, (rows[0].total, width // 4))
+                if any(len(row.embedding) != width for row in rows):
+                    # The header is already written; stop rather than emit a corrupt array
+                    raise ValueError("Embeddings of different sizes cannot share one .npy export")
+                embeddings.write(b"".join(row.embedding for row in rows))
+                for row in rows:
+                    metadata.writerow(
+                        [row_index, row.id, row.object_category, row.background_category, row.embedding_version]
+                    )
+                    row_index += 1
+                yield sink.drain()
+
+            if embeddings is None:
+                embeddings = archive.open("embeddings.npy", mode="w", force_zip64=True)
+                _write_npy_header(embeddings, (0, 0))
+            embeddings.close()
+
+            sidecar.seek(0)
+            with archive.open("metadata.csv", mode="w", force_zip64=True) as member:
+                while text := sidecar.read(1 << 20):
+                    member.write(text.encode())
+                    yield sink.drain()
+        archive.close()
+        yield sink.drain()
+
+
+def _write_npy_header(stream: Any, shape: tuple[int, int]) -> None:
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False, "shape": shape}
+    np.lib.format.write_array_header_1_0(stream, header)
+
+
+def _schema(dim: Optional[int]) -> "pa.Schema":
+    embedding_type = pa.list_(pa.float32(), dim) if dim else pa.list_(pa.float32())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("object_category", pa.string()),
+        ("background_category", pa.string()),
+        ("embedding_version", pa.string()),
+        ("embedding", embedding_type),
+    ])
+
+
+def _record_batch(rows: list[Any]) -> "pa.RecordBatch":
+    embeddings = np.frombuffer(b"".join(row.embedding for row in rows), dtype=np.float32)
+    dim = len(rows[0].embedding) // 4
+    schema = _schema(dim)
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([row.id for row in rows], type=pa.int64()),
+            pa.array([row.object_category for row in rows], type=pa.string()),
+            pa.array([row.background_category for row in rows], type=pa.string()),
+            pa.array([row.embedding_version for row in rows], type=pa.string()),
+            pa.FixedSizeListArray.from_arrays(pa.array(embeddings, type=pa.float32()), dim),
+        ],
+        schema=schema,
+    )
+
+
+def _arrow_writer(export_format: str, sink: _ChunkSink, schema: "pa.Schema") -> Any:
+    if export_format == "parquet":
+        return pq.ParquetWriter(sink, schema)
+    return pa.ipc.new_stream(sink, schema)
+
+
+def _write_batch(writer: Any, export_format: str, batch: "pa.RecordBatch") -> None:
+    if export_format == "parquet":
+        # One row group per chunk, so the writer never buffers more than a chunk
+        writer.write_batch(batch, row_group_size=batch.num_rows)
+    else:
+        writer.write_batch(batch)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional, TypeVar
+
+from sqlmodel import SQLModel
+
+from ..database import get_session
+
+RowT = TypeVar("RowT", bound=SQLModel)
+
+
+class GroupCommitWriter:
+    """Coalesces inserts from concurrent requests into shared transactions.
+
+    SQLite allows one writer at a time, so many small commits queue up on the
+    lock. Callers hand their row to ``add`` and wait; a single background task
+    commits whatever has arrived within ``max_delay_seconds`` (up to
+    ``max_batch`` rows) in one transaction.
+    """
+
+    def __init__(self, max_batch: int = 64, max_delay_seconds: float = 0.005) -> None:
+        self.max_batch = max(1, max_batch)
+        self.max_delay_seconds = max_delay_seconds
+        self._queue: asyncio.Queue[tuple[SQLModel, asyncio.Future]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Flush anything that arrived while shutting down
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._commit(batch)
+
+    async def add(self, row: RowT) -> RowT:
+        """Insert ``row`` and return it once its transaction has committed"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay_seconds
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit(batch)
+
+    async def _commit(self, batch: list[tuple[SQLModel, asyncio.Future]]) -> None:
+        try:
+            async with get_session() as session:
+                session.add_all([row for row, _ in batch])
+        except Exception as exc:
+            if len(batch) > 1:
+                # Don't let one bad row fail the rows it happened to be grouped with
+                for item in batch:
+                    await self._commit([item])
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(exc)
+            return
+
+        for row, future in batch:
+            if not future.done():
+                future.set_result(row)
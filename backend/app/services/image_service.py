@@ -1,75 +1,158 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from uuid import uuid4
 
 import numpy as np
 from fastapi import UploadFile
 from PIL import Image as PILImage
+from sqlalchemy import func, or_
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..config import Settings
+from ..metrics import (
+    CLUSTER_GROUP_SIZE,
+    CLUSTER_STAGE_SECONDS,
+    IMAGES_INGESTED,
+    INGEST_STAGE_SECONDS,
+)
 from ..models import Image
-from ..schemas import ClusterInfo
+from ..schemas import CategorySummary, ClusterInfo, ImageRead
 from ml.clip_embedder import ClipEmbedder
 from ml.clusterer import Clusterer
-from .storage_service import (
-    CloudinaryStorageService,
-    LocalStorageService,
-    StorageService,
-)
+from ml.lsh import perceptual_hash
+from .group_commit import GroupCommitWriter
+from .storage_service import StorageService, create_storage
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_CATEGORY = "unknown"
+
+
+class InvalidImageError(ValueError):
+    """The uploaded bytes could not be decoded as an image"""
 
 
 class ImageService:
-    def __init__(self, settings: Settings, embedder: ClipEmbedder, clusterer: Clusterer) -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        embedder: ClipEmbedder,
+        clusterer: Clusterer,
+        writer: Optional[GroupCommitWriter] = None,
+    ) -> None:
         self.settings = settings
         self.embedder = embedder
         self.clusterer = clusterer
-        self.storage: StorageService = self._init_storage()
-
-    def _init_storage(self) -> StorageService:
-        """Initialize storage service based on configuration"""
-        if self.settings.use_cloudinary and all([
-            self.settings.cloudinary_cloud_name,
-            self.settings.cloudinary_api_key,
-            self.settings.cloudinary_api_secret,
-        ]):
-            return CloudinaryStorageService(
-                cloud_name=self.settings.cloudinary_cloud_name,
-                api_key=self.settings.cloudinary_api_key,
-                api_secret=self.settings.cloudinary_api_secret,
-            )
-        else:
-            return LocalStorageService(self.settings.storage_root)
+        self.writer = writer
+        self.storage: StorageService = create_storage(settings)
+        # Embedding version served by clustering; set by the EmbeddingMigrator,
+        # None serves every version
+        self.active_embedding_version: Optional[str] = None
+        self._thumbnail_pool = ThreadPoolExecutor(
+            max_workers=max(1, settings.thumbnail_workers), thread_name_prefix="thumbnails"
+        )
 
     async def ingest_image(self, file: UploadFile, session: AsyncSession) -> Image:
         data = await file.read()
         original_name = file.filename or f"upload-{uuid4().hex}"
-        storage_path = self.storage.upload_image(data, original_name)
-        width, height = self._get_dimensions(data)
-        embedding = self.embedder.encode_image(data)
-        
-        # Classify object and background
-        object_category = self.embedder.classify_object(data)
-        background_category = self.embedder.classify_background(data)
+        content_type = file.content_type or "application/octet-stream"
+        return await self.ingest_bytes(data, original_name, content_type, session)
+
+    async def ingest_bytes(
+        self,
+        data: bytes,
+        original_name: str,
+        content_type: str,
+        session: AsyncSession,
+        group_commit: bool = True,
+    ) -> Image:
+        """Store and embed an image, then insert its row.
+
+        With ``group_commit=False`` the row is only flushed to ``session``, so the
+        caller can commit it atomically with its own updates.
+        """
+        # Storage upload and CLIP passes are blocking, keep them off the event loop
+        image = await asyncio.to_thread(self.prepare_image, data, original_name, content_type)
+        with INGEST_STAGE_SECONDS.time(stage="db_write"):
+            if group_commit and self.writer is not None:
+                # Committed together with concurrent uploads instead of in this session
+                image = await self.writer.add(image)
+            else:
+                session.add(image)
+                await session.flush()
+        IMAGES_INGESTED.inc()
+        return image
 
-        image = Image(
+    def prepare_image(self, data: bytes, original_name: str, content_type: str) -> Image:
+        """Store the original and run the CLIP pipeline, returning an unsaved Image"""
+        content_hash = hashlib.sha256(data).hexdigest()
+        # Decode before anything is written, so a bad upload fails without side effects
+        try:
+            with INGEST_STAGE_SECONDS.time(stage="dimensions"):
+                width, height = self._get_dimensions(data)
+            with INGEST_STAGE_SECONDS.time(stage="perceptual_hash"):
+                dhash = perceptual_hash(data)
+        except (OSError, PILImage.DecompressionBombError) as exc:
+            raise InvalidImageError(f"{original_name} is not a decodable image ({type(exc).__name__})") from exc
+
+        # Thumbnails are encoded in the pool while CLIP runs on this thread
+        thumbnails = self._thumbnail_pool.submit(self.storage.save_thumbnails, data, content_hash)
+        if self.settings.clip_adaptive_tta:
+            # One shared, confidence-gated set of views for embedding and both labels
+            with INGEST_STAGE_SECONDS.time(stage="analyze"):
+                embedding, object_category, background_category = self.embedder.analyze(data)
+        else:
+            with INGEST_STAGE_SECONDS.time(stage="embed"):
+                embedding = self.embedder.encode_image(data)
+            
+            # Classify object and background
+            with INGEST_STAGE_SECONDS.time(stage="classify_object"):
+                object_category = self.embedder.classify_object(data)
+            with INGEST_STAGE_SECONDS.time(stage="classify_background"):
+                background_category = self.embedder.classify_background(data)
+        # Only the time spent waiting once CLIP is done adds latency
+        with INGEST_STAGE_SECONDS.time(stage="thumbnails_wait"):
+            try:
+                thumbnails.result()
+            except Exception:
+                # Thumbnails are a convenience; the image is still ingested without them
+                logger.exception("Thumbnail generation failed for %s", original_name)
+        # Stored last, so a failure in any earlier stage leaves no orphaned original
+        with INGEST_STAGE_SECONDS.time(stage="storage"):
+            storage_path = self.storage.upload_image(data, original_name)
+
+        return Image(
             original_filename=original_name,
-            content_type=file.content_type or "application/octet-stream",
+            content_type=content_type,
             size_bytes=len(data),
+            content_hash=content_hash,
             storage_path=storage_path,
             width=width,
             height=height,
             embedding=embedding.tobytes(),
             object_category=object_category,
             background_category=background_category,
+            embedding_version=self.embedder.version,
+            perceptual_hash=f"{dhash:016x}",
         )
-        session.add(image)
-        await session.flush()
-        return image
+
+    def to_read(self, image: Image) -> ImageRead:
+        """Response model with public URLs for the original and its thumbnails"""
+        image_data = ImageRead.model_validate(image)
+        image_data.image_url = self.storage.get_image_url(image.storage_path)
+        image_data.thumbnail_urls = self.storage.get_thumbnail_urls(image.storage_path, image.content_hash)
+        return image_data
+
+    def thumbnail_queue_depth(self) -> int:
+        return self._thumbnail_pool._work_queue.qsize()
 
     def _get_dimensions(self, data: bytes) -> tuple[int, int]:
         with PILImage.open(BytesIO(data)) as img:
@@ -79,9 +162,46 @@ class ImageService:
         result = await session.exec(select(Image))
         return result.all()
 
-    async def get_clusters(self, session: AsyncSession) -> List[ClusterInfo]:
-        result = await session.exec(select(Image))
-        records = result.all()
+    async def list_categories(self, session: AsyncSession) -> List[CategorySummary]:
+        """Image counts per (object, background) group, answered from the category index"""
+        background = func.coalesce(Image.background_category, UNKNOWN_CATEGORY)
+        result = await session.exec(
+            select(Image.object_category, background, func.count(Image.id))
+            .where(Image.object_category.is_not(None), Image.embedding.is_not(None), *self.version_filter())
+            .group_by(Image.object_category, background)
+            .order_by(Image.object_category, background)
+        )
+        return [
+            CategorySummary(object_category=obj_cat, background_category=bg_cat, image_count=count)
+            for obj_cat, bg_cat, count in result.all()
+        ]
+
+    async def get_clusters(
+        self,
+        session: AsyncSession,
+        object_category: Optional[str] = None,
+        background_category: Optional[str] = None,
+    ) -> List[ClusterInfo]:
+        """Cluster each (object, background) group, optionally restricted to one category.
+
+        Only the columns needed for clustering are loaded, and category filters go
+        through the indexes, so a scoped request scales with the size of its group.
+        """
+        query = select(
+            Image.id, Image.embedding, Image.object_category, Image.background_category
+        ).where(Image.embedding.is_not(None), Image.object_category.is_not(None), *self.version_filter())
+        if object_category is not None:
+            query = query.where(Image.object_category == object_category)
+        if background_category == UNKNOWN_CATEGORY:
+            query = query.where(
+                or_(Image.background_category == UNKNOWN_CATEGORY, Image.background_category.is_(None))
+            )
+        elif background_category is not None:
+            query = query.where(Image.background_category == background_category)
+
+        with CLUSTER_STAGE_SECONDS.time(stage="query"):
+            result = await session.exec(query)
+            records = result.all()
         
         if not records:
             return []
@@ -91,102 +211,126 @@ class ImageService:
         category_groups: dict[tuple[str, str], list[tuple[int, np.ndarray]]] = {}
         
         for record in records:
-            if record.embedding and record.object_category:
-                obj_cat = record.object_category
-                bg_cat = record.background_category or "unknown"
-                key = (obj_cat, bg_cat)
-                
-                if key not in category_groups:
-                    category_groups[key] = []
-                
-                embedding = np.frombuffer(record.embedding, dtype=np.float32)
-                category_groups[key].append((record.id, embedding))
+            obj_cat = record.object_category
+            bg_cat = record.background_category or UNKNOWN_CATEGORY
+            key = (obj_cat, bg_cat)
+            
+            if key not in category_groups:
+                category_groups[key] = []
+            
+            embedding = np.frombuffer(record.embedding, dtype=np.float32)
+            category_groups[key].append((record.id, embedding))
 
         clusters: list[ClusterInfo] = []
-        cluster_id = 0
 
         # For each object+background combination, use clustering if multiple images
-        for (object_category, bg_cat), image_records in category_groups.items():
-            image_ids = [rid for rid, _ in image_records]
-            embeddings = [emb for _, emb in image_records]
+        for (obj_cat, bg_cat), image_records in category_groups.items():
+            CLUSTER_GROUP_SIZE.observe(len(image_records))
+            with CLUSTER_STAGE_SECONDS.time(stage="cluster_group"):
+                clusters.extend(self._cluster_group(obj_cat, bg_cat, image_records))
+
+        return clusters
+
+    def version_filter(self) -> list:
+        """Keep embeddings from other model versions out of the same vector space"""
+        if self.active_embedding_version is None:
+            return []
+        return [Image.embedding_version == self.active_embedding_version]
+
+    @staticmethod
+    def _cluster_id(object_category: str, bg_cat: str, label: str) -> int:
+        """Id derived from the group and label, so it is the same in scoped and unscoped responses.
+
+        48 bits keeps it a safe integer in JavaScript clients.
+        """
+        digest = hashlib.blake2b(f"{object_category}\0{bg_cat}\0{label}".encode(), digest_size=6).digest()
+        return int.from_bytes(digest, "big")
+
+    def _cluster_group(
+        self,
+        object_category: str,
+        bg_cat: str,
+        image_records: list[tuple[int, np.ndarray]],
+    ) -> list[ClusterInfo]:
+        clusters: list[ClusterInfo] = []
+        image_ids = [rid for rid, _ in image_records]
+        embeddings = [emb for _, emb in image_records]
+        
+        if len(embeddings) == 1:
+            # Single image - no clustering needed
+            category_name = f"{object_category} - {bg_cat}"
+            clusters.append(
+                ClusterInfo(
+                    cluster_id=self._cluster_id(object_category, bg_cat, "all"),
+                    category_name=category_name,
+                    object_category=object_category,
+                    background_category=bg_cat,
+                    centroid=embeddings[0].tolist(),
+                    image_ids=image_ids,
+                )
+            )
+            return clusters
+
+        # Multiple images - apply clustering to find natural subgroups
+        matrix = np.vstack(embeddings)
+        labels, centroids = self.clusterer.cluster_embeddings(matrix)
+        
+        # Handle HDBSCAN noise points (label -1) - put them in a separate cluster
+        unique_labels = np.unique(labels)
+        unique_labels = unique_labels[unique_labels != -1]  # Remove noise label
+        
+        if len(unique_labels) == 0:
+            # All points are noise - treat as one cluster
+            category_name = f"{object_category} - {bg_cat}"
+            centroid = matrix.mean(axis=0).tolist()
+            clusters.append(
+                ClusterInfo(
+                    cluster_id=self._cluster_id(object_category, bg_cat, "all"),
+                    category_name=category_name,
+                    object_category=object_category,
+                    background_category=bg_cat,
+                    centroid=centroid,
+                    image_ids=image_ids,
+                )
+            )
+            return clusters
+
+        # Create a cluster for each detected sub-cluster
+        for label_idx, label in enumerate(unique_labels):
+            clustered_ids = [image_ids[i] for i, lbl in enumerate(labels) if lbl == label]
+            centroid = centroids[label_idx].tolist()
             
-            if len(embeddings) == 1:
-                # Single image - no clustering needed
+            # Add sub-cluster suffix if multiple clusters exist
+            if len(unique_labels) > 1:
+                category_name = f"{object_category} - {bg_cat} (group {label_idx + 1})"
+            else:
                 category_name = f"{object_category} - {bg_cat}"
-                clusters.append(
-                    ClusterInfo(
-                        cluster_id=cluster_id,
-                        category_name=category_name,
-                        object_category=object_category,
-                        background_category=bg_cat,
-                        centroid=embeddings[0].tolist(),
-                        image_ids=image_ids,
-                    )
+            
+            clusters.append(
+                ClusterInfo(
+                    cluster_id=self._cluster_id(object_category, bg_cat, str(label_idx)),
+                    category_name=category_name,
+                    object_category=object_category,
+                    background_category=bg_cat,
+                    centroid=centroid,
+                    image_ids=clustered_ids,
                 )
-                cluster_id += 1
-            else:
-                # Multiple images - apply clustering to find natural subgroups
-                matrix = np.vstack(embeddings)
-                labels, centroids = self.clusterer.cluster_embeddings(matrix)
-                
-                # Handle HDBSCAN noise points (label -1) - put them in a separate cluster
-                unique_labels = np.unique(labels)
-                unique_labels = unique_labels[unique_labels != -1]  # Remove noise label
-                
-                if len(unique_labels) == 0:
-                    # All points are noise - treat as one cluster
-                    category_name = f"{object_category} - {bg_cat}"
-                    centroid = matrix.mean(axis=0).tolist()
-                    clusters.append(
-                        ClusterInfo(
-                            cluster_id=cluster_id,
-                            category_name=category_name,
-                            object_category=object_category,
-                            background_category=bg_cat,
-                            centroid=centroid,
-                            image_ids=image_ids,
-                        )
-                    )
-                    cluster_id += 1
-                else:
-                    # Create a cluster for each detected sub-cluster
-                    for label_idx, label in enumerate(unique_labels):
-                        clustered_ids = [image_ids[i] for i, lbl in enumerate(labels) if lbl == label]
-                        centroid = centroids[label_idx].tolist()
-                        
-                        # Add sub-cluster suffix if multiple clusters exist
-                        if len(unique_labels) > 1:
-                            category_name = f"{object_category} - {bg_cat} (group {label_idx + 1})"
-                        else:
-                            category_name = f"{object_category} - {bg_cat}"
-                        
-                        clusters.append(
-                            ClusterInfo(
-                                cluster_id=cluster_id,
-                                category_name=category_name,
-                                object_category=object_category,
-                                background_category=bg_cat,
-                                centroid=centroid,
-                                image_ids=clustered_ids,
-                            )
-                        )
-                        cluster_id += 1
-                    
-                    # Handle noise points separately if any
-                    noise_ids = [image_ids[i] for i, lbl in enumerate(labels) if lbl == -1]
-                    if len(noise_ids) > 0:
-                        noise_embeddings = [embeddings[i] for i, lbl in enumerate(labels) if lbl == -1]
-                        noise_centroid = np.vstack(noise_embeddings).mean(axis=0).tolist()
-                        clusters.append(
-                            ClusterInfo(
-                                cluster_id=cluster_id,
-                                category_name=f"{object_category} - {bg_cat} (outliers)",
-                                object_category=object_category,
-                                background_category=bg_cat,
-                                centroid=noise_centroid,
-                                image_ids=noise_ids,
-                            )
-                        )
-                        cluster_id += 1
+            )
+        
+        # Handle noise points separately if any
+        noise_ids = [image_ids[i] for i, lbl in enumerate(labels) if lbl == -1]
+        if len(noise_ids) > 0:
+            noise_embeddings = [embeddings[i] for i, lbl in enumerate(labels) if lbl == -1]
+            noise_centroid = np.vstack(noise_embeddings).mean(axis=0).tolist()
+            clusters.append(
+                ClusterInfo(
+                    cluster_id=self._cluster_id(object_category, bg_cat, "outliers"),
+                    category_name=f"{object_category} - {bg_cat} (outliers)",
+                    object_category=object_category,
+                    background_category=bg_cat,
+                    centroid=noise_centroid,
+                    image_ids=noise_ids,
+                )
+            )
 
         return clusters
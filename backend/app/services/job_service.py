@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import UploadFile
+from sqlalchemy import func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..config import Settings
+from ..database import get_session
+from ..metrics import INGEST_JOBS
+from ..models import IngestJob
+from .image_service import ImageService, InvalidImageError
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobQueue:
+    """Durable ingest queue backed by the IngestJob table with an in-process worker pool"""
+
+    def __init__(self, settings: Settings, image_service: ImageService) -> None:
+        self.settings = settings
+        self.image_service = image_service
+        self.spool_root = settings.job_spool_root
+        self.spool_root.mkdir(parents=True, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._stopping = False
+        # Approximate in-memory depths for metrics, seeded from the table on start
+        self.pending_count = 0
+        self.running_count = 0
+
+    async def enqueue(self, file: UploadFile, session: AsyncSession) -> IngestJob:
+        """Persist the upload to the spool directory and record a pending job"""
+        data = await file.read()
+        original_name = file.filename or f"upload-{uuid4().hex}"
+        sanitized_name = original_name.replace("/", "_")
+        spool_path = self.spool_root / f"{uuid4().hex}_{sanitized_name}"
+        await asyncio.to_thread(spool_path.write_bytes, data)
+
+        job = IngestJob(
+            original_filename=original_name,
+            content_type=file.content_type or "application/octet-stream",
+            spool_path=str(spool_path),
+            max_attempts=self.settings.job_max_attempts,
+        )
+        session.add(job)
+        # Commit before acknowledging so the job survives a crash right after the 202
+        await session.commit()
+        self.pending_count += 1
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: int, session: AsyncSession) -> Optional[IngestJob]:
+        return await session.get(IngestJob, job_id)
+
+    async def start(self) -> None:
+        await self._recover_interrupted()
+        async with get_session() as session:
+            result = await session.exec(
+                select(func.count(IngestJob.id)).where(IngestJob.status == JOB_PENDING)
+            )
+            self.pending_count = result.one()
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(max(1, self.settings.job_workers))
+        ]
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _recover_interrupted(self) -> None:
+        """Jobs left running by a previous process are handed back to the queue.
+
+        A job that already used its last attempt most likely took the process
+        down with it (e.g. running out of memory), so it fails instead of
+        crashing every restart.
+        """
+        async with get_session() as session:
+            now = datetime.utcnow()
+            result = await session.exec(
+                select(IngestJob).where(
+                    IngestJob.status == JOB_RUNNING, IngestJob.attempts >= IngestJob.max_attempts
+                )
+            )
+            spool_paths = []
+            for record in result.all():
+                spool_paths.append(Path(record.spool_path))
+                record.status = JOB_FAILED
+                record.error = record.error or "Interrupted on its last attempt"
+                record.updated_at = now
+                INGEST_JOBS.inc(status=JOB_FAILED)
+            await session.exec(
+                update(IngestJob)
+                .where(IngestJob.status == JOB_RUNNING)
+                .values(status=JOB_PENDING, updated_at=now)
+            )
+        for spool_path in spool_paths:
+            await asyncio.to_thread(spool_path.unlink, missing_ok=True)
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            job = await self._claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.settings.job_poll_interval_seconds
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _claim(self) -> Optional[IngestJob]:
+        """Atomically move the oldest available job from pending to running"""
+        async with get_session() as session:
+            while True:
+                now = datetime.utcnow()
+                result = await session.exec(
+                    select(IngestJob)
+                    .where(
+                        IngestJob.status == JOB_PENDING,
+                        IngestJob.available_at <= now,
+                        IngestJob.attempts < IngestJob.max_attempts,
+                    )
+                    .order_by(IngestJob.id)
+                    .limit(1)
+                )
+                job = result.first()
+                if job is None:
+                    return None
+
+                claimed = await session.exec(
+                    update(IngestJob)
+                    .where(IngestJob.id == job.id, IngestJob.status == JOB_PENDING)
+                    .values(status=JOB_RUNNING, attempts=IngestJob.attempts + 1, updated_at=now)
+                )
+                if claimed.rowcount == 1:
+                    await session.refresh(job)
+                    self.pending_count = max(0, self.pending_count - 1)
+                    return job
+                # Another worker claimed it first, try the next one
+
+    async def _run(self, job: IngestJob) -> None:
+        spool_path = Path(job.spool_path)
+        self.running_count += 1
+        try:
+            data = await asyncio.to_thread(spool_path.read_bytes)
+            async with get_session() as session:
+                # Bypass the group-commit writer so the Image row and job completion
+                # commit together; a retry can then never insert the image twice
+                image = await self.image_service.ingest_bytes(
+                    data, job.original_filename, job.content_type, session, group_commit=False
+                )
+                record = await session.get(IngestJob, job.id)
+                record.status = JOB_COMPLETED
+                record.image_id = image.id
+                record.error = None
+                record.updated_at = datetime.utcnow()
+        except Exception as exc:
+            await self._record_failure(job.id, exc)
+            return
+        finally:
+            self.running_count -= 1
+
+        INGEST_JOBS.inc(status=JOB_COMPLETED)
+        spool_path.unlink(missing_ok=True)
+
+    async def _record_failure(self, job_id: int, exc: Exception) -> None:
+        async with get_session() as session:
+            record = await session.get(IngestJob, job_id)
+            now = datetime.utcnow()
+            record.error = f"{type(exc).__name__}: {exc}"
+            record.updated_at = now
+            # Undecodable bytes fail the same way every time, so don't retry them
+            if isinstance(exc, InvalidImageError) or record.attempts >= record.max_attempts:
+                record.status = JOB_FAILED
+                spool_path = Path(record.spool_path)
+                INGEST_JOBS.inc(status=JOB_FAILED)
+            else:
+                # Exponential backoff between retries
+                delay = self.settings.job_retry_delay_seconds * 2 ** (record.attempts - 1)
+                record.status = JOB_PENDING
+                record.available_at = now + timedelta(seconds=delay)
+                self.pending_count += 1
+                INGEST_JOBS.inc(status="retried")
+                return
+        # Only removed once the failure is committed; nothing will read it again
+        await asyncio.to_thread(spool_path.unlink, missing_ok=True)
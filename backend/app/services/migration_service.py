@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..config import Settings
+from ..database import get_session
+from ..models import EmbeddingMigration, Image, StagedEmbedding
+
+if TYPE_CHECKING:
+    # Annotation only, so the export CLI can read the active version without loading CLIP
+    from .image_service import ImageService
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_RUNNING = "running"
+MIGRATION_FAILED = "failed"
+MIGRATION_COMPLETED = "completed"
+MIGRATION_SUPERSEDED = "superseded"
+
+# Version assigned to embeddings stored before rows were versioned
+LEGACY_EMBEDDING_VERSION = "unversioned"
+
+
+async def load_active_version(session: AsyncSession) -> Optional[str]:
+    """Target of the last completed migration, None if no migration has completed"""
+    result = await session.exec(
+        select(EmbeddingMigration.target_version)
+        .where(EmbeddingMigration.status == MIGRATION_COMPLETED)
+        .order_by(EmbeddingMigration.id.desc())
+        .limit(1)
+    )
+    return result.first()
+
+
+class EmbeddingMigrator:
+    """Re-embeds stored images when the embedder version changes.
+
+    New embeddings are written to StagedEmbedding in batches, each committed
+    together with the migration's checkpoint so a restart resumes after the
+    last finished batch. Clustering keeps serving the previous version until
+    every image is staged, then a single transaction swaps them all in.
+
+    Images whose original cannot be re-embedded keep their old embedding and
+    are marked with the target in ``embedding_failed_version``, so later starts
+    don't queue them for the same version again.
+    """
+
+    def __init__(self, settings: Settings, image_service: ImageService) -> None:
+        self.settings = settings
+        self.image_service = image_service
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def target_version(self) -> str:
+        return self.image_service.embedder.version
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Work out the active version and resume or create a migration if needed"""
+        target = self.target_version
+        async with get_session() as session:
+            active = await load_active_version(session)
+            if active is None:
+                active = await self._adopt_legacy(session, target)
+            else:
+                await session.exec(
+                    update(Image)
+                    .where(Image.embedding_version.is_(None), Image.embedding.is_not(None))
+                    .values(embedding_version=LEGACY_EMBEDDING_VERSION)
+                )
+            self.image_service.active_embedding_version = active
+
+            migration = await self._current_migration(session, target)
+            if migration is None:
+                pending = await self._count_pending(session, target)
+                if active == target and pending == 0:
+                    return
+                migration = EmbeddingMigration(target_version=target, total=pending)
+                session.add(migration)
+                await session.flush()
+            migration_id = migration.id
+
+        if self.settings.embedding_migration_auto_start:
+            await self.resume(migration_id)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def resume(self, migration_id: int) -> None:
+        """Run the migration in the background, restarting it if it had failed"""
+        if self.is_running:
+            return
+        async with get_session() as session:
+            migration = await session.get(EmbeddingMigration, migration_id)
+            if migration is not None and migration.status == MIGRATION_FAILED:
+                migration.status = MIGRATION_RUNNING
+                migration.updated_at = datetime.utcnow()
+        self._task = asyncio.create_task(self._run(migration_id))
+
+    async def get_status(self, session: AsyncSession) -> Optional[EmbeddingMigration]:
+        result = await session.exec(
+            select(EmbeddingMigration).order_by(EmbeddingMigration.id.desc()).limit(1)
+        )
+        return result.first()
+
+    async def _adopt_legacy(self, session: AsyncSession, target: str) -> str:
+        """First start since embeddings were versioned: tag stored embeddings as ``target``.
+
+        Nothing indicates the model changed, and re-embedding the whole library
+        would hide every new upload from clustering until it finished. Recorded
+        as a completed migration so later starts know which version is active.
+        """
+        await session.exec(
+            update(Image)
+            .where(
+                Image.embedding.is_not(None),
+                or_(Image.embedding_version.is_(None), Image.embedding_version == LEGACY_EMBEDDING_VERSION),
+            )
+            .values(embedding_version=target)
+        )
+        now = datetime.utcnow()
+        session.add(
+            EmbeddingMigration(target_version=target, status=MIGRATION_COMPLETED, updated_at=now, completed_at=now)
+        )
+        return target
+
+    async def _current_migration(self, session: AsyncSession, target: str) -> Optional[EmbeddingMigration]:
+        """The unfinished migration for ``target``; ones for other versions are abandoned"""
+        result = await session.exec(
+            select(EmbeddingMigration).where(EmbeddingMigration.status.in_((MIGRATION_RUNNING, MIGRATION_FAILED)))
+        )
+        current = None
+        for migration in result.all():
+            if migration.target_version == target and current is None:
+                current = migration
+                continue
+            await session.exec(delete(StagedEmbedding).where(StagedEmbedding.migration_id == migration.id))
+            migration.status = MIGRATION_SUPERSEDED
+            migration.updated_at = datetime.utcnow()
+        return current
+
+    async def _count_pending(self, session: AsyncSession, target: str) -> int:
+        result = await session.exec(select(func.count(Image.id)).where(self._needs_embedding(target)))
+        return result.one()
+
+    @staticmethod
+    def _needs_embedding(target: str) -> Any:
+        return and_(
+            or_(Image.embedding_version.is_(None), Image.embedding_version != target),
+            or_(Image.embedding_failed_version.is_(None), Image.embedding_failed_version != target),
+        )
+
+    async def _run(self, migration_id: int) -> None:
+        try:
+            await self._migrate(migration_id)
+        except Exception as exc:
+            # e.g. the model download failing; the checkpoint survives for a resume
+            logger.exception("Embedding migration %s failed", migration_id)
+            async with get_session() as session:
+                migration = await session.get(EmbeddingMigration, migration_id)
+                migration.status = MIGRATION_FAILED
+                migration.error = f"{type(exc).__name__}: {exc}"
+                migration.updated_at = datetime.utcnow()
+
+    async def _migrate(self, migration_id: int) -> None:
+        batch_size = max(1, self.settings.embedding_migration_batch_size)
+        duty_cycle = self.settings.embedding_migration_duty_cycle
+        while True:
+            async with get_session() as session:
+                migration = await session.get(EmbeddingMigration, migration_id)
+                if migration is None or migration.status != MIGRATION_RUNNING:
+                    return
+                result = await session.exec(
+                    select(Image.id, Image.storage_path)
+                    .where(Image.id > migration.last_image_id, self._needs_embedding(migration.target_version))
+                    .order_by(Image.id)
+                    .limit(batch_size)
+                )
+                batch = result.all()
+            if not batch:
+                await self._swap(migration_id)
+                return
+
+            started = time.monotonic()
+            staged, errors = await asyncio.to_thread(self._embed_batch, migration_id, batch)
+            async with get_session() as session:
+                # Staged rows, failure marks and the checkpoint commit together
+                migration = await session.get(EmbeddingMigration, migration_id)
+                if staged:
+                    await session.exec(insert(StagedEmbedding), params=staged)
+                if errors:
+                    for image_id, error in errors:
+                        logger.warning("Could not re-embed image %s: %s", image_id, error)
+                    await session.exec(
+                        update(Image)
+                        .where(Image.id.in_([image_id for image_id, _ in errors]))
+                        .values(embedding_failed_version=migration.target_version)
+                    )
+                    migration.error = f"image {errors[-1][0]}: {errors[-1][1]}"
+                migration.last_image_id = batch[-1].id
+                migration.processed += len(staged)
+                migration.failed += len(errors)
+                migration.updated_at = datetime.utcnow()
+
+            # Leave the rest of each cycle to live traffic
+            if 0 < duty_cycle < 1:
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(elapsed * (1 - duty_cycle) / duty_cycle)
+
+    def _embed_batch(
+        self, migration_id: int, batch: list[Any]
+    ) -> tuple[list[dict[str, Any]], list[tuple[int, str]]]:
+        """Read originals back from storage and embed them in one forward pass.
+
+        Returns the staged rows and ``(image_id, error)`` for unreadable originals.
+        """
+        embedder = self.image_service.embedder
+        storage = self.image_service.storage
+        image_ids: list[int] = []
+        pixel_batches = []
+        errors: list[tuple[int, str]] = []
+        for image_id, storage_path in batch:
+            try:
+                data = storage.read_image(storage_path)
+                pixel_batches.append(embedder.preprocess_views(embedder.decode(data)))
+                image_ids.append(image_id)
+            except Exception as exc:
+                errors.append((image_id, f"{type(exc).__name__}: {exc}"))
+
+        analyses = embedder.analyze_preprocessed(pixel_batches)
+        staged = [
+            {
+                "image_id": image_id,
+                "migration_id": migration_id,
+                "embedding": embedding.tobytes(),
+                "object_category": object_category,
+                "background_category": background_category,
+            }
+            for image_id, (embedding, object_category, background_category) in zip(image_ids, analyses)
+        ]
+        return staged, errors
+
+    async def _swap(self, migration_id: int) -> None:
+        """Move every staged embedding into Image and switch the active version atomically"""
+        async with get_session() as session:
+            migration = await session.get(EmbeddingMigration, migration_id)
+            staged = (
+                select(StagedEmbedding)
+                .where(StagedEmbedding.image_id == Image.id, StagedEmbedding.migration_id == migration_id)
+            )
+            await session.exec(
+                update(Image)
+                .where(Image.id.in_(select(StagedEmbedding.image_id).where(StagedEmbedding.migration_id == migration_id)))
+                .values(
+                    embedding=staged.with_only_columns(StagedEmbedding.embedding).scalar_subquery(),
+                    object_category=staged.with_only_columns(StagedEmbedding.object_category).scalar_subquery(),
+                    background_category=staged.with_only_columns(StagedEmbedding.background_category).scalar_subquery(),
+                    embedding_version=migration.target_version,
+                )
+            )
+            await session.exec(delete(StagedEmbedding).where(StagedEmbedding.migration_id == migration_id))
+            now = datetime.utcnow()
+            migration.status = MIGRATION_COMPLETED
+            migration.updated_at = now
+            migration.completed_at = now
+            target = migration.target_version
+        self.image_service.active_embedding_version = target
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import os
+import urllib.request
 from abc import ABC, abstractmethod
+from io import BytesIO
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 from uuid import uuid4
 
+from PIL import Image as PILImage
+
+from ..config import Settings
+
 try:
     import cloudinary
     import cloudinary.uploader
@@ -26,13 +33,38 @@ class StorageService(ABC):
         """Get public URL for an image"""
         pass
 
+    @abstractmethod
+    def read_image(self, storage_path: str) -> bytes:
+        """Read back the original bytes of a stored image"""
+        pass
+
+    def save_thumbnails(self, data: bytes, content_hash: str) -> None:
+        """Generate resized derivatives of an image (no-op if the backend resizes on the fly)"""
+
+    def get_thumbnail_urls(self, storage_path: str, content_hash: Optional[str]) -> dict[int, str]:
+        """Get public thumbnail URLs keyed by size"""
+        return {}
+
 
 class LocalStorageService(StorageService):
     """Local filesystem storage"""
+
+    THUMBNAIL_DIR = "thumbnails"
     
-    def __init__(self, storage_root: Path) -> None:
+    def __init__(
+        self,
+        storage_root: Path,
+        thumbnail_sizes: Sequence[int] = (),
+        thumbnail_format: str = "webp",
+        thumbnail_quality: int = 80,
+    ) -> None:
         self.storage_root = storage_root
         self.storage_root.mkdir(parents=True, exist_ok=True)
+        self.thumbnail_sizes = sorted(set(thumbnail_sizes), reverse=True)
+        self.thumbnail_format = thumbnail_format.lower()
+        self.thumbnail_quality = thumbnail_quality
+        self.thumbnail_root = self.storage_root / self.THUMBNAIL_DIR
+        self.thumbnail_root.mkdir(parents=True, exist_ok=True)
     
     def upload_image(self, data: bytes, original_name: str) -> str:
         sanitized_name = original_name.replace("/", "_")
@@ -49,6 +81,50 @@ class LocalStorageService(StorageService):
         filename = Path(storage_path).name
         return f"/storage/{filename}"
 
+    def read_image(self, storage_path: str) -> bytes:
+        return Path(storage_path).read_bytes()
+
+    def save_thumbnails(self, data: bytes, content_hash: str) -> None:
+        """Write one thumbnail per configured size, named by content hash"""
+        missing = [size for size in self.thumbnail_sizes if not self._thumbnail_path(content_hash, size).exists()]
+        if not missing:
+            return
+
+        with PILImage.open(BytesIO(data)) as img:
+            # Let the JPEG decoder downscale while decoding, which is much cheaper
+            img.draft("RGB", (missing[0], missing[0]))
+            current = img.convert("RGB")
+
+        # Largest first so each size is resized from the previous, smaller one
+        for size in missing:
+            current.thumbnail((size, size), PILImage.LANCZOS)
+            path = self._thumbnail_path(content_hash, size)
+            tmp_path = path.with_name(f".{uuid4().hex}{path.suffix}")
+            current.save(tmp_path, format=self._pil_format(), quality=self.thumbnail_quality)
+            os.replace(tmp_path, path)
+
+    def get_thumbnail_urls(self, storage_path: str, content_hash: Optional[str]) -> dict[int, str]:
+        """URLs of the thumbnails actually on disk.
+
+        Rows stored before thumbnails existed, or before a size was added to
+        THUMBNAIL_SIZES, or whose encode failed, only advertise what was written.
+        """
+        if not content_hash:
+            return {}
+        urls = {}
+        for size in sorted(self.thumbnail_sizes):
+            path = self._thumbnail_path(content_hash, size)
+            if path.exists():
+                urls[size] = f"/storage/{self.THUMBNAIL_DIR}/{path.name}"
+        return urls
+
+    def _thumbnail_path(self, content_hash: str, size: int) -> Path:
+        extension = "jpg" if self._pil_format() == "JPEG" else "webp"
+        return self.thumbnail_root / f"{content_hash}_{size}.{extension}"
+
+    def _pil_format(self) -> str:
+        return "JPEG" if self.thumbnail_format in ("jpeg", "jpg") else "WEBP"
+
 
 class CloudinaryStorageService(StorageService):
     """Cloudinary cloud storage"""
@@ -59,6 +135,7 @@ class CloudinaryStorageService(StorageService):
         api_key: str,
         api_secret: str,
         folder: str = "ai-image-organizer",
+        thumbnail_sizes: Sequence[int] = (),
     ) -> None:
         if not CLOUDINARY_AVAILABLE:
             raise ImportError("cloudinary package is not installed. Install it with: pip install cloudinary")
@@ -69,6 +146,7 @@ class CloudinaryStorageService(StorageService):
             api_secret=api_secret,
         )
         self.folder = folder
+        self.thumbnail_sizes = sorted(set(thumbnail_sizes))
     
     def upload_image(self, data: bytes, original_name: str) -> str:
         """Upload to Cloudinary and return public_id"""
@@ -96,3 +174,42 @@ class CloudinaryStorageService(StorageService):
             ],
         )
 
+    def read_image(self, storage_path: str) -> bytes:
+        """Download the untransformed original"""
+        url = cloudinary.CloudinaryImage(storage_path).build_url(secure=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.read()
+
+    def get_thumbnail_urls(self, storage_path: str, content_hash: Optional[str]) -> dict[int, str]:
+        """Cloudinary resizes on request, so thumbnails are just transformation URLs"""
+        return {
+            size: cloudinary.CloudinaryImage(storage_path).build_url(
+                secure=True,
+                transformation=[
+                    {"width": size, "height": size, "crop": "limit", "quality": "auto", "fetch_format": "auto"},
+                ],
+            )
+            for size in self.thumbnail_sizes
+        }
+
+
+def create_storage(settings: Settings) -> StorageService:
+    """Initialize storage service based on configuration"""
+    if settings.use_cloudinary and all([
+        settings.cloudinary_cloud_name,
+        settings.cloudinary_api_key,
+        settings.cloudinary_api_secret,
+    ]):
+        return CloudinaryStorageService(
+            cloud_name=settings.cloudinary_cloud_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret,
+            thumbnail_sizes=settings.thumbnail_sizes,
+        )
+    else:
+        return LocalStorageService(
+            settings.storage_root,
+            thumbnail_sizes=settings.thumbnail_sizes,
+            thumbnail_format=settings.thumbnail_format,
+            thumbnail_quality=settings.thumbnail_quality,
+        )
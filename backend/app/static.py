@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files that are written once and never modified.
+
+    Stored originals get a unique name per upload and thumbnails are named by
+    content hash, so each URL always maps to the same bytes. That allows a
+    strong ETag and a year-long immutable Cache-Control.
+    """
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["etag"] = _strong_etag(Path(full_path).name, stat_result.st_size)
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _strong_etag(filename: str, size: int) -> str:
+    digest = hashlib.sha1(f"{filename}:{size}".encode()).hexdigest()
+    return f'"{digest}"'
@@ -0,0 +1,4 @@
+"""Offline benchmarks for the embedder, clusterer and API hot paths.
+
+Run with ``python -m benchmarks.run``; see ``benchmarks/README.md``.
+"""
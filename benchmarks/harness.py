@@ -0,0 +1,150 @@
+"""Timing, result storage and baseline comparison for the benchmark suite."""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import platform
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: dict[str, Any]
+    timings_s: list[float]
+    items_per_call: int = 1  # e.g. embeddings clustered or images per request
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{name}={value}" for name, value in sorted(self.params.items()))
+        return f"{self.name}[{params}]"
+
+    def summary(self) -> dict[str, Any]:
+        timings = sorted(self.timings_s)
+        median = statistics.median(timings)
+        return {
+            "key": self.key,
+            "name": self.name,
+            "params": self.params,
+            "repeat": len(timings),
+            "mean_s": statistics.fmean(timings),
+            "median_s": median,
+            "min_s": timings[0],
+            "max_s": timings[-1],
+            "p95_s": percentile(timings, 95),
+            "items_per_s": self.items_per_call / median if median > 0 else None,
+            **self.extra,
+        }
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(
+    fn: Callable[[int], Any], repeat: int, warmup: int = 1
+) -> list[float]:
+    """Time ``fn(i)`` ``repeat`` times after ``warmup`` untimed calls.
+
+    The call index lets benchmarks feed distinct inputs so caches keyed on the
+    input (like decoded-image caching) don't hide the work being measured.
+    """
+    for i in range(warmup):
+        fn(i)
+    timings = []
+    for i in range(warmup, warmup + repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_async(
+    fn: Callable[[int], Awaitable[Any]], repeat: int, warmup: int = 1
+) -> list[float]:
+    async def run() -> list[float]:
+        for i in range(warmup):
+            await fn(i)
+        timings = []
+        for i in range(warmup, warmup + repeat):
+            start = time.perf_counter()
+            await fn(i)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    return asyncio.run(run())
+
+
+def environment() -> dict[str, Any]:
+    import numpy
+    import torch
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": numpy.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def save_results(path: Path, results: list[BenchmarkResult]) -> None:
+    payload = {
+        "environment": environment(),
+        "results": [result.summary() for result in results],
+    }
+    path.write_text(json.dumps(payload, indent=2))
+
+
+def load_results(path: Path) -> dict[str, dict[str, Any]]:
+    payload = json.loads(path.read_text())
+    return {entry["key"]: entry for entry in payload["results"]}
+
+
+def compare(
+    current: list[BenchmarkResult],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float,
+) -> list[str]:
+    """Print median timings against a baseline and return keys that regressed"""
+    regressions = []
+    print(f"{'benchmark':<70} {'baseline':>10} {'current':>10} {'change':>8}")
+    for result in current:
+        summary = result.summary()
+        previous: Optional[dict[str, Any]] = baseline.get(result.key)
+        if previous is None:
+            print(f"{result.key:<70} {'-':>10} {summary['median_s']:>10.4f} {'new':>8}")
+            continue
+        change = summary["median_s"] / previous["median_s"] - 1 if previous["median_s"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(result.key)
+            flag = "  REGRESSION"
+        print(
+            f"{result.key:<70} {previous['median_s']:>10.4f} {summary['median_s']:>10.4f} "
+            f"{change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def print_summary(results: list[BenchmarkResult]) -> None:
+    print(f"{'benchmark':<70} {'median_s':>10} {'p95_s':>10} {'items/s':>10}")
+    for result in results:
+        summary = result.summary()
+        rate = summary["items_per_s"]
+        rate_text = f"{rate:>10.1f}" if rate is not None else f"{'-':>10}"
+        print(f"{result.key:<70} {summary['median_s']:>10.4f} {summary['p95_s']:>10.4f} {rate_text}")
@@ -0,0 +1,255 @@
+"""Load generator reporting throughput and tail latency for the API.
+
+Usage:
+    # In-process through an ASGI transport, temporary DB/storage, offline model
+    python -m benchmarks.loadtest --concurrency 16 --requests 500
+
+    # Against a running server, e.g. `uvicorn backend.app.main:app --workers 1`
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --duration 60
+
+    # Mix of operations by weight and upload image sizes
+    python -m benchmarks.loadtest --mix upload=1,list=4,clusters=1 --image-sizes 256,1024,2048
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+from .harness import environment, percentile
+from .offline import synthetic_image_bytes
+
+OPERATIONS = ("upload", "list", "clusters")
+
+
+@dataclass
+class Sample:
+    operation: str
+    latency_s: float
+    ok: bool
+
+
+class ImagePool:
+    """Pre-encoded synthetic JPEGs; each upload gets unique trailing bytes.
+
+    Decoders ignore data after the JPEG end marker, so the image is the same
+    but its hash differs and server-side caches keyed on content never hit.
+    """
+
+    def __init__(self, sizes: list[int], per_size: int = 4, seed: int = 0) -> None:
+        self._images = [
+            (size, synthetic_image_bytes(size, seed=seed + i)) for size in sizes for i in range(per_size)
+        ]
+        self._random = random.Random(seed)
+
+    def next_upload(self) -> tuple[str, bytes]:
+        size, data = self._random.choice(self._images)
+        return f"load-{size}.jpg", data + os.urandom(16)
+
+
+async def _run_operation(client: httpx.AsyncClient, operation: str, images: ImagePool) -> bool:
+    if operation == "upload":
+        filename, data = images.next_upload()
+        response = await client.post("/images", files={"file": (filename, data, "image/jpeg")})
+    elif operation == "list":
+        response = await client.get("/images")
+    else:
+        response = await client.get("/clusters")
+    return response.status_code < 400
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    mix: dict[str, float],
+    concurrency: int,
+    total_requests: Optional[int],
+    duration_s: Optional[float],
+    images: ImagePool,
+    seed: int = 0,
+) -> tuple[list[Sample], float]:
+    operations = list(mix)
+    weights = [mix[operation] for operation in operations]
+    rng = random.Random(seed)
+    samples: list[Sample] = []
+    issued = 0
+    started = time.perf_counter()
+    deadline = started + duration_s if duration_s else None
+
+    def next_operation() -> Optional[str]:
+        nonlocal issued
+        if total_requests is not None and issued >= total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return rng.choices(operations, weights)[0]
+
+    async def worker() -> None:
+        while (operation := next_operation()) is not None:
+            start = time.perf_counter()
+            try:
+                ok = await _run_operation(client, operation, images)
+            except httpx.HTTPError:
+                ok = False
+            samples.append(Sample(operation, time.perf_counter() - start, ok))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: list[Sample], elapsed_s: float) -> dict[str, Any]:
+    def stats(group: list[Sample]) -> dict[str, Any]:
+        latencies = sorted(sample.latency_s for sample in group)
+        return {
+            "requests": len(group),
+            "errors": sum(not sample.ok for sample in group),
+            "throughput_rps": len(group) / elapsed_s if elapsed_s > 0 else 0.0,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "p99_s": percentile(latencies, 99),
+            "max_s": latencies[-1] if latencies else 0.0,
+        }
+
+    by_operation = {
+        operation: stats([sample for sample in samples if sample.operation == operation])
+        for operation in OPERATIONS
+        if any(sample.operation == operation for sample in samples)
+    }
+    return {"elapsed_s": elapsed_s, "overall": stats(samples), "operations": by_operation}
+
+
+def print_report(summary: dict[str, Any]) -> None:
+    print(f"{'operation':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+    rows = list(summary["operations"].items()) + [("overall", summary["overall"])]
+    for name, row in rows:
+        print(
+            f"{name:<10} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>9.1f} "
+            f"{row['p50_s'] * 1000:>9.1f} {row['p95_s'] * 1000:>9.1f} {row['p99_s'] * 1000:>9.1f} "
+            f"{row['max_s'] * 1000:>9.1f}"
+        )
+    print(f"\nelapsed {summary['elapsed_s']:.1f}s")
+
+
+async def _in_process_client(stack: AsyncExitStack, workdir: Path, real_model: bool) -> httpx.AsyncClient:
+    """Start the app in-process against a throwaway database and storage directory"""
+    # Settings are read at import time, so point them at the temp dir first
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/loadtest.db"
+    os.environ["STORAGE_ROOT"] = str(workdir / "storage")
+    os.environ["JOB_SPOOL_ROOT"] = str(workdir / "job_spool")
+    (workdir / "storage").mkdir()
+
+    from backend.app.main import app
+
+    await stack.enter_async_context(app.router.lifespan_context(app))
+    if not real_model:
+        from backend.app import metrics
+        from .offline import build_offline_embedder
+
+        service = app.state.image_service
+        settings = service.settings
+        # The startup migration targets the configured model, which is never loaded here
+        await app.state.embedding_migrator.stop()
+        service.embedder = build_offline_embedder(
+            use_augmentation=settings.clip_use_augmentation,
+            num_augmentations=settings.clip_num_augmentations,
+            timer=metrics.clip_stage_timer if settings.metrics_enabled else None,
+            adaptive_tta=settings.clip_adaptive_tta,
+            tta_margin_threshold=settings.clip_tta_margin_threshold,
+            tta_max_views=settings.clip_tta_max_views,
+        )
+        # Cluster what the offline model ingests rather than the configured model's version
+        service.active_embedding_version = service.embedder.version
+    transport = httpx.ASGITransport(app=app)
+    return await stack.enter_async_context(
+        httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None)
+    )
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected one of {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    images = ImagePool(args.image_sizes, seed=args.seed)
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.url, timeout=None))
+        else:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            client = await _in_process_client(stack, workdir, args.real_model)
+
+        # Seed uploads so list/cluster requests have data to work on
+        for _ in range(args.seed_images):
+            await _run_operation(client, "upload", images)
+
+        samples, elapsed = await run_load(
+            client,
+            args.mix,
+            args.concurrency,
+            None if args.duration else args.requests,
+            args.duration,
+            images,
+            seed=args.seed,
+        )
+
+    summary = summarize(samples, elapsed)
+    summary["config"] = {
+        "target": args.url or "in-process",
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "image_sizes": args.image_sizes,
+        "seed_images": args.seed_images,
+        "real_model": bool(args.url) or args.real_model,
+    }
+    summary["environment"] = environment()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the image organizer API")
+    parser.add_argument("--url", help="Base URL of a running server; in-process when omitted")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a request count")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("upload=1,list=2,clusters=1"),
+                        help="Operation weights, e.g. upload=1,list=4,clusters=1")
+    parser.add_argument("--image-sizes", type=_int_list, default=[256, 1024, 2048],
+                        help="Heights of the synthetic upload images")
+    parser.add_argument("--seed-images", type=int, default=20, help="Uploads before measuring")
+    parser.add_argument("--real-model", action="store_true",
+                        help="In-process only: keep the configured CLIP model instead of the offline one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(main_async(args))
+    print_report(summary)
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2))
+        print(f"Saved summary to {args.output}")
+    return 1 if summary["overall"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
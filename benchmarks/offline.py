@@ -0,0 +1,139 @@
+"""Fixtures that let benchmarks run without downloading model weights.
+
+A randomly initialized CLIP model built from a small config has the same
+preprocessing and call pattern as the real one, so relative timings of the
+surrounding code (decode, augmentation, batching, clustering, DB access) stay
+meaningful even though absolute model cost is lower.
+"""
+from __future__ import annotations
+
+import json
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPConfig, CLIPImageProcessor, CLIPModel, CLIPProcessor, CLIPTokenizer
+from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+from ml.clip_embedder import ClipEmbedder
+
+OFFLINE_MODEL_NAME = "offline-random-clip"
+EMBEDDING_DIM = 512
+
+
+def build_offline_processor() -> CLIPProcessor:
+    """CLIP processor with a byte-level tokenizer and no BPE merges.
+
+    Every prompt tokenizes to one token per character, which is enough for the
+    text encoder to run.
+    """
+    characters = list(bytes_to_unicode().values())
+    vocab: dict[str, int] = {}
+    for character in characters:
+        vocab[character] = len(vocab)
+    for character in characters:
+        vocab[f"{character}</w>"] = len(vocab)
+    vocab["<|startoftext|>"] = len(vocab)
+    vocab["<|endoftext|>"] = len(vocab)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vocab_file = Path(tmp) / "vocab.json"
+        merges_file = Path(tmp) / "merges.txt"
+        vocab_file.write_text(json.dumps(vocab))
+        merges_file.write_text("#version: 0.2\n")
+        tokenizer = CLIPTokenizer(str(vocab_file), str(merges_file))
+
+    return CLIPProcessor(image_processor=CLIPImageProcessor(), tokenizer=tokenizer)
+
+
+def build_offline_model(vocab_size: int, seed: int = 0) -> CLIPModel:
+    """Small randomly initialized CLIP with the real input size and embedding width"""
+    torch.manual_seed(seed)
+    config = CLIPConfig(
+        text_config={
+            "vocab_size": vocab_size,
+            "hidden_size": 64,
+            "intermediate_size": 128,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 2,
+            "max_position_embeddings": 77,
+        },
+        vision_config={
+            "hidden_size": 64,
+            "intermediate_size": 128,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 2,
+            "image_size": 224,
+            "patch_size": 32,
+        },
+        projection_dim=EMBEDDING_DIM,
+    )
+    return CLIPModel(config)
+
+
+def build_offline_embedder(
+    use_augmentation: bool = True,
+    num_augmentations: int = 3,
+    **kwargs: Any,
+) -> ClipEmbedder:
+    processor = build_offline_processor()
+    model = build_offline_model(vocab_size=len(processor.tokenizer))
+    return ClipEmbedder(
+        OFFLINE_MODEL_NAME,
+        "cpu",
+        use_augmentation=use_augmentation,
+        num_augmentations=num_augmentations,
+        model=model,
+        processor=processor,
+        **kwargs,
+    )
+
+
+def synthetic_image_bytes(size: int, seed: int, image_format: str = "JPEG") -> bytes:
+    """Noise plus a smooth gradient, so JPEG decode cost resembles a real photo"""
+    rng = np.random.default_rng(seed)
+    height, width = size, int(size * 4 / 3)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 40, size=(height, width, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise + rng.uniform(0, 80, size=3), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def synthetic_embeddings(
+    count: int, dim: int = EMBEDDING_DIM, centers: int = 20, seed: int = 0, shared_direction: float = 0.0
+) -> np.ndarray:
+    """Normalized embeddings drawn around a handful of centers, like real CLIP groups.
+
+    ``shared_direction`` adds a component common to every embedding, as real
+    CLIP image embeddings have; 1.25 gives a mean pairwise cosine of about 0.6.
+    """
+    rng = np.random.default_rng(seed)
+    center_vectors = rng.normal(size=(centers, dim)).astype(np.float32)
+    assignment = rng.integers(0, centers, size=count)
+    embeddings = center_vectors[assignment] + rng.normal(scale=0.6, size=(count, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    if shared_direction:
+        direction = rng.normal(size=dim).astype(np.float32)
+        embeddings += shared_direction * direction / np.linalg.norm(direction)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.astype(np.float32)
+
+
+def synthetic_categories(count: int, seed: int = 0) -> list[tuple[str, str]]:
+    """(object, background) labels spread over the embedder's categories"""
+    objects = [
+        prompt.replace("a photo of a ", "").replace("a photo of an ", "").replace("a photo of ", "")
+        for prompt in ClipEmbedder.OBJECT_CATEGORIES
+    ]
+    backgrounds = [prompt.replace(" background", "") for prompt in ClipEmbedder.BACKGROUND_CATEGORIES]
+    rng = np.random.default_rng(seed)
+    return [
+        (objects[rng.integers(len(objects))], backgrounds[rng.integers(len(backgrounds))])
+        for _ in range(count)
+    ]
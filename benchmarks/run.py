@@ -0,0 +1,299 @@
+"""Run the offline benchmark suite.
+
+Usage:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output bench.json --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.run --only clusterer --cluster-sizes 1000,10000
+    python -m benchmarks.run --only tta --tta-thresholds 0.05,0.15,0.3
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import Settings
+from backend.app.models import Image
+from backend.app.services.image_service import ImageService
+from ml.clip_embedder import ClipEmbedder
+from ml.clusterer import Clusterer
+from ml.lsh import LSHIndex
+
+from .harness import (
+    BenchmarkResult,
+    compare,
+    load_results,
+    measure,
+    measure_async,
+    print_summary,
+    save_results,
+)
+from .offline import (
+    build_offline_embedder,
+    synthetic_categories,
+    synthetic_embeddings,
+    synthetic_image_bytes,
+)
+
+SUITES = ("embedder", "tta", "clusterer", "duplicates", "api")
+
+
+def bench_embedder(image_sizes: list[int], tta_settings: list[int], repeat: int) -> list[BenchmarkResult]:
+    results = []
+    for num_augmentations in tta_settings:
+        embedder = build_offline_embedder(
+            use_augmentation=num_augmentations > 1, num_augmentations=num_augmentations
+        )
+        for size in image_sizes:
+            # Distinct images per call so the decode cache never hits
+            images = [synthetic_image_bytes(size, seed) for seed in range(repeat + 1)]
+            params = {"image_size": size, "tta": num_augmentations}
+            for name, fn in (
+                ("embedder.encode_image", embedder.encode_image),
+                ("embedder.classify_object", embedder.classify_object),
+                ("embedder.classify_background", embedder.classify_background),
+            ):
+                timings = measure(lambda i, fn=fn: fn(images[i]), repeat=repeat)
+                results.append(BenchmarkResult(name, params, timings))
+
+            # Bulk-import path: decode + preprocess per image, one forward for the batch
+            batch = [embedder.preprocess_views(embedder.decode(data)) for data in images[:8]]
+            timings = measure(lambda i: embedder.analyze_preprocessed(batch), repeat=repeat)
+            results.append(
+                BenchmarkResult("embedder.analyze_preprocessed", {**params, "batch": len(batch)}, timings, len(batch))
+            )
+    return results
+
+
+def bench_tta(
+    num_augmentations: int, thresholds: list[float], image_size: int, images_count: int, real_model: bool
+) -> list[BenchmarkResult]:
+    """Full TTA vs confidence-gated TTA: time per image, views used and label agreement.
+
+    The offline model is random, so its margins (and therefore the skip rate)
+    say little about real photos; pass --real-model to measure the configured
+    CLIP weights instead.
+    """
+    def embedder_for(**kwargs: Any) -> ClipEmbedder:
+        if real_model:
+            settings = Settings()
+            return ClipEmbedder(settings.clip_model_name, settings.clip_device, **kwargs)
+        return build_offline_embedder(**kwargs)
+
+    images = [synthetic_image_bytes(image_size, seed) for seed in range(images_count + 1)]
+    params = {"image_size": image_size, "tta": num_augmentations}
+
+    full = embedder_for(use_augmentation=True, num_augmentations=num_augmentations)
+    reference: dict[int, tuple[str, str]] = {}
+
+    def run_full(i: int) -> None:
+        reference[i] = full.analyze(images[i])[1:]
+
+    results = [
+        BenchmarkResult(
+            "embedder.analyze", {**params, "threshold": "off"}, measure(run_full, repeat=images_count),
+            extra={"mean_views": full.tta_views / full.tta_images, "skip_rate": 0.0},
+        )
+    ]
+    for threshold in thresholds:
+        adaptive = embedder_for(
+            use_augmentation=True,
+            num_augmentations=num_augmentations,
+            adaptive_tta=True,
+            tta_margin_threshold=threshold,
+        )
+        labels: dict[int, tuple[str, str]] = {}
+
+        def run_adaptive(i: int) -> None:
+            labels[i] = adaptive.analyze(images[i])[1:]
+
+        timings = measure(run_adaptive, repeat=images_count)
+        compared = [i for i in labels if i in reference]
+        results.append(BenchmarkResult(
+            "embedder.analyze",
+            {**params, "threshold": threshold},
+            timings,
+            extra={
+                "mean_views": adaptive.tta_views / adaptive.tta_images,
+                "skip_rate": adaptive.tta_skipped / adaptive.tta_images,
+                "object_agreement": sum(labels[i][0] == reference[i][0] for i in compared) / len(compared),
+                "background_agreement": sum(labels[i][1] == reference[i][1] for i in compared) / len(compared),
+            },
+        ))
+    return results
+
+
+def bench_clusterer(sizes: list[int], repeat: int) -> list[BenchmarkResult]:
+    results = []
+    for count in sizes:
+        embeddings = synthetic_embeddings(count)
+        # Large inputs take long enough that one timed run is representative
+        runs = repeat if count <= 10_000 else 1
+        for method in ("kmeans", "hdbscan"):
+            clusterer = Clusterer(method=method)
+            timings = measure(lambda i: clusterer.cluster_embeddings(embeddings), repeat=runs, warmup=0)
+            results.append(BenchmarkResult("clusterer.cluster_embeddings", {"method": method, "n": count}, timings, count))
+    return results
+
+
+def bench_duplicates(sizes: list[int], repeat: int) -> list[BenchmarkResult]:
+    results = []
+    # Real CLIP embeddings share a large common direction, which skews buckets
+    # unless the index centers them; "anisotropic" reproduces that
+    for count in sizes:
+        for spread, shared_direction in (("isotropic", 0.0), ("anisotropic", 1.25)):
+            embeddings = synthetic_embeddings(count, shared_direction=shared_direction)
+            index = LSHIndex(embeddings.shape[1])
+
+            def build(i: int) -> None:
+                nonlocal index
+                index = LSHIndex(embeddings.shape[1])
+                index.add(range(count), embeddings)
+
+            params = {"n": count, "spread": spread}
+            results.append(BenchmarkResult("lsh.add", params, measure(build, repeat=repeat), count))
+            timings = measure(lambda i: index.duplicate_groups(0.95), repeat=repeat)
+            results.append(
+                BenchmarkResult("lsh.duplicate_groups", {**params, "threshold": 0.95}, timings, count)
+            )
+    return results
+
+
+async def _seed_database(database_url: str, rows: int) -> sessionmaker:
+    engine = create_async_engine(database_url, future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    embeddings = synthetic_embeddings(rows)
+    categories = synthetic_categories(rows)
+    created_at = datetime.utcnow()
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        chunk = 5_000
+        for start in range(0, rows, chunk):
+            await session.exec(
+                insert(Image),
+                params=[
+                    {
+                        "original_filename": f"seed-{i}.jpg",
+                        "content_type": "image/jpeg",
+                        "size_bytes": 100_000,
+                        "content_hash": f"{i:064x}",
+                        "storage_path": f"storage/seed-{i}.jpg",
+                        "width": 1024,
+                        "height": 768,
+                        "created_at": created_at,
+                        "embedding": embeddings[i].tobytes(),
+                        "object_category": categories[i][0],
+                        "background_category": categories[i][1],
+                    }
+                    for i in range(start, min(start + chunk, rows))
+                ],
+            )
+        await session.commit()
+    return session_factory
+
+
+def bench_api(rows: int, method: str, repeat: int) -> list[BenchmarkResult]:
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(
+            database_url=f"sqlite+aiosqlite:///{tmp}/bench.db",
+            storage_root=Path(tmp) / "storage",
+            clustering_method=method,
+        )
+        session_factory = asyncio.run(_seed_database(settings.database_url, rows))
+        service = ImageService(
+            settings,
+            build_offline_embedder(use_augmentation=False, num_augmentations=1),
+            Clusterer(method=method),
+        )
+        object_category, background_category = synthetic_categories(1)[0]
+        params = {"rows": rows, "method": method}
+
+        async def list_images(i: int) -> Any:
+            async with session_factory() as session:
+                return await service.list_images(session)
+
+        async def get_clusters(i: int) -> Any:
+            async with session_factory() as session:
+                return await service.get_clusters(session)
+
+        async def get_clusters_scoped(i: int) -> Any:
+            async with session_factory() as session:
+                return await service.get_clusters(session, object_category, background_category)
+
+        return [
+            BenchmarkResult("api.list_images", params, measure_async(list_images, repeat), rows),
+            BenchmarkResult("api.get_clusters", params, measure_async(get_clusters, repeat), rows),
+            BenchmarkResult("api.get_clusters_scoped", params, measure_async(get_clusters_scoped, repeat)),
+        ]
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def _float_list(value: str) -> list[float]:
+    return [float(item) for item in value.split(",") if item]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for embedder, clustering and API paths")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed median slowdown vs baseline before flagging (0.10 = 10%%)")
+    parser.add_argument("--only", default=",".join(SUITES), help=f"Comma-separated subset of {SUITES}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--image-sizes", type=_int_list, default=[256, 1024, 2048])
+    parser.add_argument("--tta", type=_int_list, default=[1, 3], help="Augmented view counts to test")
+    parser.add_argument("--tta-thresholds", type=_float_list, default=[0.05, 0.15, 0.3],
+                        help="Adaptive TTA margin thresholds to compare against full TTA")
+    parser.add_argument("--tta-images", type=int, default=20, help="Images per adaptive TTA setting")
+    parser.add_argument("--real-model", action="store_true",
+                        help="tta suite only: use the configured CLIP weights instead of the offline model")
+    parser.add_argument("--cluster-sizes", type=_int_list, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--db-rows", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    np.random.seed(0)
+    suites = {suite.strip() for suite in args.only.split(",")}
+    results: list[BenchmarkResult] = []
+    if "embedder" in suites:
+        results += bench_embedder(args.image_sizes, args.tta, args.repeat)
+    if "tta" in suites:
+        results += bench_tta(max(args.tta), args.tta_thresholds, 512, args.tta_images, args.real_model)
+    if "clusterer" in suites:
+        results += bench_clusterer(args.cluster_sizes, args.repeat)
+    if "duplicates" in suites:
+        results += bench_duplicates(args.cluster_sizes, args.repeat)
+    if "api" in suites:
+        for method in ("kmeans", "hdbscan"):
+            results += bench_api(args.db_rows, method, args.repeat)
+
+    print_summary(results)
+    save_results(args.output, results)
+    print(f"\nSaved {len(results)} results to {args.output}")
+
+    if args.baseline:
+        print()
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
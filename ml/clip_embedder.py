@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+from contextlib import nullcontext
 from functools import lru_cache
 from io import BytesIO
-from typing import Optional
+from typing import ContextManager, Optional
 
 import albumentations as A
 import numpy as np
@@ -39,13 +41,34 @@ class ClipEmbedder:
         device: str = "cpu",
         use_augmentation: bool = True,
         num_augmentations: int = 3,
+        model: Optional[CLIPModel] = None,  # Preloaded model/processor, e.g. for offline benchmarks
+        processor: Optional[CLIPProcessor] = None,
+        timer: Optional[Callable[[str], ContextManager]] = None,  # Stage timing hook, e.g. for metrics
+        adaptive_tta: bool = False,
+        tta_margin_threshold: float = 0.15,
+        tta_max_views: Optional[int] = None,
     ) -> None:
         self.model_name = model_name
         self.device = device
         self.use_augmentation = use_augmentation
         self.num_augmentations = num_augmentations
-        self._model: Optional[CLIPModel] = None
-        self._processor: Optional[CLIPProcessor] = None
+        # Adaptive TTA (used by analyze): only add augmented views while the
+        # top-1/top-2 probability margin is below the threshold
+        self.adaptive_tta = adaptive_tta
+        self.tta_margin_threshold = tta_margin_threshold
+        self.tta_max_views = tta_max_views
+        self.tta_images = 0
+        self.tta_views = 0
+        self.tta_skipped = 0
+        self._model: Optional[CLIPModel] = model
+        self._processor: Optional[CLIPProcessor] = processor
+        if self._model is not None:
+            self._model.to(self.device)
+            self._model.eval()
+        self._text_features: dict[tuple[str, ...], torch.Tensor] = {}
+        self.timer = timer
+        self.text_cache_hits = 0
+        self.text_cache_misses = 0
         
         # Define augmentation pipeline for test-time augmentation
         if self.use_augmentation:
@@ -57,17 +80,60 @@ class ClipEmbedder:
                 A.GaussNoise(var_limit=(10.0, 50.0), p=0.2),
             ])
 
+    @property
+    def version(self) -> str:
+        """Identifies the model and view configuration that produced an embedding.
+
+        Embeddings with different versions are not comparable, so stored rows are
+        tagged with it and re-embedded when it changes.
+        """
+        views = self._max_views()
+        version = f"{self.model_name}:views={views}"
+        if self.adaptive_tta and views > 1:
+            version += f":adaptive={self.tta_margin_threshold:g}"
+        return version
+
     def _ensure_model_loaded(self) -> None:
-        if self._model is None or self._processor is None:
+        self._ensure_processor_loaded()
+        if self._model is None:
             self._model = CLIPModel.from_pretrained(self.model_name)
-            self._processor = CLIPProcessor.from_pretrained(self.model_name)
             self._model.to(self.device)
             self._model.eval()
 
+    def _ensure_processor_loaded(self) -> None:
+        # Preprocessing workers only need the processor, not the model weights
+        if self._processor is None:
+            self._processor = CLIPProcessor.from_pretrained(self.model_name)
+
     @lru_cache(maxsize=128)
     def _load_image(self, data_hash: str, data: bytes) -> Image.Image:  # noqa: D401
         # Simple cache by content hash to avoid re-decoding duplicates in batch scenarios.
-        return Image.open(BytesIO(data)).convert("RGB")
+        with self._timed("decode"):
+            return Image.open(BytesIO(data)).convert("RGB")
+
+    def _timed(self, stage: str) -> ContextManager:
+        return self.timer(stage) if self.timer is not None else nullcontext()
+
+    def _views(self, pil_image: Image.Image) -> list[Image.Image]:
+        """Original image followed by the test-time augmented views (if enabled)"""
+        views = [pil_image]
+        if self.use_augmentation and self.num_augmentations > 1:
+            with self._timed("augment"):
+                np_image = np.array(pil_image)
+                for _ in range(self.num_augmentations - 1):
+                    augmented = self.augmentation(image=np_image)["image"]
+                    views.append(Image.fromarray(augmented))
+        return views
+
+    def _image_features(self, pil_image: Image.Image) -> torch.Tensor:
+        """Normalized CLIP features for one view, shape (1, dim)"""
+        with self._timed("preprocess"):
+            inputs = self._processor(images=pil_image, return_tensors="pt")
+            inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
+
+        with self._timed("forward"), torch.no_grad():
+            features = self._model.get_image_features(**inputs)
+            return torch.nn.functional.normalize(features, p=2, dim=-1)
 
     def encode_image(self, data: bytes) -> np.ndarray:
         self._ensure_model_loaded()
@@ -78,29 +144,12 @@ class ClipEmbedder:
         data_hash = str(hash(data))
         pil_image = self._load_image(data_hash, data)
 
-        if self.use_augmentation and self.num_augmentations > 1:
-            # Test-time augmentation: create multiple views and average embeddings
-            embeddings = []
-            
-            # Original image
-            embedding = self._encode_single_image(pil_image)
-            embeddings.append(embedding)
-            
-            # Augmented versions
-            np_image = np.array(pil_image)
-            for _ in range(self.num_augmentations - 1):
-                augmented = self.augmentation(image=np_image)["image"]
-                aug_pil = Image.fromarray(augmented)
-                aug_embedding = self._encode_single_image(aug_pil)
-                embeddings.append(aug_embedding)
-            
-            # Average the embeddings for robustness
-            embeddings_array = np.vstack(embeddings)
-            final_embedding = embeddings_array.mean(axis=0)
-            return final_embedding.astype(np.float32)
-        else:
-            # No augmentation - single pass
-            return self._encode_single_image(pil_image)
+        # Test-time augmentation: average embeddings over the original and augmented
+        # views for robustness (a single pass when augmentation is off)
+        embeddings = [self._encode_single_image(view) for view in self._views(pil_image)]
+        if len(embeddings) == 1:
+            return embeddings[0]
+        return np.vstack(embeddings).mean(axis=0).astype(np.float32)
 
     def _encode_single_image(self, pil_image: Image.Image) -> np.ndarray:
         """Encode a single PIL image to embedding"""
@@ -108,16 +157,19 @@ class ClipEmbedder:
         assert self._model is not None
         assert self._processor is not None
 
-        inputs = self._processor(images=pil_image, return_tensors="pt")
-        inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
-
-        with torch.no_grad():
-            features = self._model.get_image_features(**inputs)
-            features = torch.nn.functional.normalize(features, p=2, dim=-1)
-
+        features = self._image_features(pil_image)
         embedding = features.cpu().numpy().astype(np.float32)
         return embedding[0]
 
+    def _view_similarities(self, pil_image: Image.Image, text_features: torch.Tensor) -> np.ndarray:
+        """Image-text similarities averaged over the TTA views"""
+        similarities = []
+        for view in self._views(pil_image):
+            with torch.no_grad():
+                similarity = (self._image_features(view) @ text_features.T).squeeze(0)
+            similarities.append(similarity.cpu().numpy())
+        return np.mean(similarities, axis=0)
+
     def classify_object(self, data: bytes) -> str:
         """Classify the main object in an image using CLIP text-image similarity with TTA"""
         self._ensure_model_loaded()
@@ -128,55 +180,9 @@ class ClipEmbedder:
         pil_image = self._load_image(data_hash, data)
 
         # Encode text categories once
-        text_inputs = self._processor(text=self.OBJECT_CATEGORIES, return_tensors="pt", padding=True)
-        text_inputs = {name: tensor.to(self.device) for name, tensor in text_inputs.items()}
-
-        with torch.no_grad():
-            text_features = self._model.get_text_features(**text_inputs)
-            text_features = torch.nn.functional.normalize(text_features, p=2, dim=-1)
-
-        # Use TTA for classification too
-        if self.use_augmentation and self.num_augmentations > 1:
-            similarities = []
-            
-            # Original image
-            image_inputs = self._processor(images=pil_image, return_tensors="pt")
-            image_inputs = {name: tensor.to(self.device) for name, tensor in image_inputs.items()}
-            with torch.no_grad():
-                image_features = self._model.get_image_features(**image_inputs)
-                image_features = torch.nn.functional.normalize(image_features, p=2, dim=-1)
-                similarity = (image_features @ text_features.T).squeeze(0)
-                similarities.append(similarity.cpu().numpy())
-            
-            # Augmented versions
-            np_image = np.array(pil_image)
-            for _ in range(self.num_augmentations - 1):
-                augmented = self.augmentation(image=np_image)["image"]
-                aug_pil = Image.fromarray(augmented)
-                aug_inputs = self._processor(images=aug_pil, return_tensors="pt")
-                aug_inputs = {name: tensor.to(self.device) for name, tensor in aug_inputs.items()}
-                with torch.no_grad():
-                    aug_features = self._model.get_image_features(**aug_inputs)
-                    aug_features = torch.nn.functional.normalize(aug_features, p=2, dim=-1)
-                    aug_similarity = (aug_features @ text_features.T).squeeze(0)
-                    similarities.append(aug_similarity.cpu().numpy())
-            
-            # Average similarities across augmentations
-            avg_similarity = np.mean(similarities, axis=0)
-            best_match_idx = avg_similarity.argmax()
-        else:
-            # Single pass without augmentation
-            image_inputs = self._processor(images=pil_image, return_tensors="pt")
-            image_inputs = {name: tensor.to(self.device) for name, tensor in image_inputs.items()}
-            with torch.no_grad():
-                image_features = self._model.get_image_features(**image_inputs)
-                image_features = torch.nn.functional.normalize(image_features, p=2, dim=-1)
-                similarity = (image_features @ text_features.T).squeeze(0)
-                best_match_idx = similarity.argmax().item()
-            
-        # Return category name without "a photo of a" prefix
-        category = self.OBJECT_CATEGORIES[best_match_idx]
-        return category.replace("a photo of a ", "").replace("a photo of an ", "").replace("a photo of ", "")
+        text_features = self._encode_text(self.OBJECT_CATEGORIES)
+        similarity = self._view_similarities(pil_image, text_features)
+        return self._object_label(similarity.argmax())
 
     def classify_background(self, data: bytes) -> str:
         """Classify the background type in an image with TTA"""
@@ -188,50 +194,156 @@ class ClipEmbedder:
         pil_image = self._load_image(data_hash, data)
 
         # Encode text categories once
-        text_inputs = self._processor(text=self.BACKGROUND_CATEGORIES, return_tensors="pt", padding=True)
-        text_inputs = {name: tensor.to(self.device) for name, tensor in text_inputs.items()}
+        text_features = self._encode_text(self.BACKGROUND_CATEGORIES)
+        similarity = self._view_similarities(pil_image, text_features)
+        return self._background_label(similarity.argmax())
+
+    def analyze(self, data: bytes) -> tuple[np.ndarray, str, str]:
+        """Embedding plus object and background labels from one shared set of views.
+
+        Without adaptive TTA this uses the original plus ``num_augmentations - 1``
+        augmented views, averaged like ``encode_image`` and ``classify_*`` but with
+        a third of the forward passes. With adaptive TTA the original view is
+        scored first and augmented views are added one at a time only while
+        either classification's top-1/top-2 probability margin is below
+        ``tta_margin_threshold``, up to ``tta_max_views`` views in total.
+        """
+        self._ensure_model_loaded()
+        assert self._model is not None
+        assert self._processor is not None
+
+        data_hash = str(hash(data))
+        pil_image = self._load_image(data_hash, data)
+        object_text = self._encode_text(self.OBJECT_CATEGORIES)
+        background_text = self._encode_text(self.BACKGROUND_CATEGORIES)
+
+        max_views = self._max_views()
+        features = [self._image_features(pil_image)]
+        np_image = None
+        while len(features) < max_views:
+            if self.adaptive_tta and self._is_confident(torch.cat(features), object_text, background_text):
+                break
+            if np_image is None:
+                np_image = np.array(pil_image)
+            with self._timed("augment"):
+                augmented = Image.fromarray(self.augmentation(image=np_image)["image"])
+            features.append(self._image_features(augmented))
+
+        self.tta_images += 1
+        self.tta_views += len(features)
+        if len(features) == 1 and max_views > 1:
+            self.tta_skipped += 1
 
         with torch.no_grad():
-            text_features = self._model.get_text_features(**text_inputs)
-            text_features = torch.nn.functional.normalize(text_features, p=2, dim=-1)
+            stacked = torch.cat(features)
+            object_similarity = (stacked @ object_text.T).mean(dim=0).cpu().numpy()
+            background_similarity = (stacked @ background_text.T).mean(dim=0).cpu().numpy()
+        embedding = stacked.cpu().numpy().mean(axis=0).astype(np.float32)
+        return (
+            embedding,
+            self._object_label(object_similarity.argmax()),
+            self._background_label(background_similarity.argmax()),
+        )
+
+    def _max_views(self) -> int:
+        if not self.use_augmentation or self.num_augmentations <= 1:
+            return 1
+        if self.adaptive_tta and self.tta_max_views is not None:
+            return max(1, self.tta_max_views)
+        return self.num_augmentations
+
+    def _is_confident(
+        self, features: torch.Tensor, object_text: torch.Tensor, background_text: torch.Tensor
+    ) -> bool:
+        """Whether both zero-shot answers clear the margin on the views scored so far"""
+        with torch.no_grad():
+            logit_scale = self._model.logit_scale.exp()
+            for text_features in (object_text, background_text):
+                similarity = (features @ text_features.T).mean(dim=0)
+                probabilities = torch.softmax(logit_scale * similarity, dim=-1)
+                top = torch.topk(probabilities, k=min(2, probabilities.numel())).values
+                margin = (top[0] - top[1]).item() if top.numel() > 1 else 1.0
+                if margin < self.tta_margin_threshold:
+                    return False
+        return True
+
+    def _encode_text(self, prompts: list[str]) -> torch.Tensor:
+        """Normalized text features for a prompt list, cached since prompts never change"""
+        key = tuple(prompts)
+        if key in self._text_features:
+            self.text_cache_hits += 1
+            return self._text_features[key]
+
+        self.text_cache_misses += 1
+        with self._timed("text_encode"):
+            text_inputs = self._processor(text=list(prompts), return_tensors="pt", padding=True)
+            text_inputs = {name: tensor.to(self.device) for name, tensor in text_inputs.items()}
 
-        # Use TTA for classification
-        if self.use_augmentation and self.num_augmentations > 1:
-            similarities = []
-            
-            # Original image
-            image_inputs = self._processor(images=pil_image, return_tensors="pt")
-            image_inputs = {name: tensor.to(self.device) for name, tensor in image_inputs.items()}
-            with torch.no_grad():
-                image_features = self._model.get_image_features(**image_inputs)
-                image_features = torch.nn.functional.normalize(image_features, p=2, dim=-1)
-                similarity = (image_features @ text_features.T).squeeze(0)
-                similarities.append(similarity.cpu().numpy())
-            
-            # Augmented versions
-            np_image = np.array(pil_image)
-            for _ in range(self.num_augmentations - 1):
-                augmented = self.augmentation(image=np_image)["image"]
-                aug_pil = Image.fromarray(augmented)
-                aug_inputs = self._processor(images=aug_pil, return_tensors="pt")
-                aug_inputs = {name: tensor.to(self.device) for name, tensor in aug_inputs.items()}
-                with torch.no_grad():
-                    aug_features = self._model.get_image_features(**aug_inputs)
-                    aug_features = torch.nn.functional.normalize(aug_features, p=2, dim=-1)
-                    aug_similarity = (aug_features @ text_features.T).squeeze(0)
-                    similarities.append(aug_similarity.cpu().numpy())
-            
-            # Average similarities
-            avg_similarity = np.mean(similarities, axis=0)
-            best_match_idx = avg_similarity.argmax()
-        else:
-            # Single pass
-            image_inputs = self._processor(images=pil_image, return_tensors="pt")
-            image_inputs = {name: tensor.to(self.device) for name, tensor in image_inputs.items()}
             with torch.no_grad():
-                image_features = self._model.get_image_features(**image_inputs)
-                image_features = torch.nn.functional.normalize(image_features, p=2, dim=-1)
-                similarity = (image_features @ text_features.T).squeeze(0)
-                best_match_idx = similarity.argmax().item()
-            
-        return self.BACKGROUND_CATEGORIES[best_match_idx].replace(" background", "")
+                text_features = self._model.get_text_features(**text_inputs)
+                text_features = torch.nn.functional.normalize(text_features, p=2, dim=-1)
+        self._text_features[key] = text_features
+        return text_features
+
+    def _object_label(self, index: int) -> str:
+        # Return category name without "a photo of a" prefix
+        category = self.OBJECT_CATEGORIES[int(index)]
+        return category.replace("a photo of a ", "").replace("a photo of an ", "").replace("a photo of ", "")
+
+    def _background_label(self, index: int) -> str:
+        return self.BACKGROUND_CATEGORIES[int(index)].replace(" background", "")
+
+    def decode(self, data: bytes) -> Image.Image:
+        with self._timed("decode"):
+            return Image.open(BytesIO(data)).convert("RGB")
+
+    def preprocess_views(self, pil_image: Image.Image) -> np.ndarray:
+        """Build the TTA views of an image and return their pixel values (views, C, H, W).
+
+        Only needs the processor, so it can run in preprocessing worker processes.
+        """
+        self._ensure_processor_loaded()
+        assert self._processor is not None
+
+        views = self._views(pil_image)
+        with self._timed("preprocess"):
+            inputs = self._processor(images=views, return_tensors="np")
+        return inputs["pixel_values"].astype(np.float32)
+
+    def analyze_preprocessed(
+        self, pixel_batches: list[np.ndarray]
+    ) -> list[tuple[np.ndarray, str, str]]:
+        """Embed and classify many preprocessed images in a single forward pass.
+
+        Each entry of ``pixel_batches`` holds the views from ``preprocess_views``.
+        The views are shared between the embedding and both classifications, so an
+        image costs ``num_augmentations`` passes instead of three times that.
+        Returns ``(embedding, object_category, background_category)`` per image.
+        """
+        self._ensure_model_loaded()
+        assert self._model is not None
+        assert self._processor is not None
+
+        if not pixel_batches:
+            return []
+
+        counts = [batch.shape[0] for batch in pixel_batches]
+        pixel_values = torch.from_numpy(np.concatenate(pixel_batches)).to(self.device)
+        with self._timed("forward_batch"), torch.no_grad():
+            features = self._model.get_image_features(pixel_values=pixel_values)
+            features = torch.nn.functional.normalize(features, p=2, dim=-1)
+            object_similarity = (features @ self._encode_text(self.OBJECT_CATEGORIES).T).cpu().numpy()
+            background_similarity = (features @ self._encode_text(self.BACKGROUND_CATEGORIES).T).cpu().numpy()
+        features_np = features.cpu().numpy()
+
+        results = []
+        start = 0
+        for count in counts:
+            views = slice(start, start + count)
+            start += count
+            # Same averaging as encode_image / classify_* with TTA
+            embedding = features_np[views].mean(axis=0).astype(np.float32)
+            object_category = self._object_label(object_similarity[views].mean(axis=0).argmax())
+            background_category = self._background_label(background_similarity[views].mean(axis=0).argmax())
+            results.append((embedding, object_category, background_category))
+        return results
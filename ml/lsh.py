@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from io import BytesIO
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+
+class LSHIndex:
+    """Random-hyperplane LSH over embeddings for near-duplicate search.
+
+    Each of ``num_tables`` tables hashes a normalized embedding to the sign
+    pattern of its projections onto ``num_bits`` random hyperplanes. Two
+    vectors at angle theta share a bit with probability 1 - theta / pi, so
+    near-duplicates collide in at least one table with high probability while
+    unrelated images rarely share a bucket. Only pairs that share a bucket are
+    compared exactly, which keeps a scan near-linear in the number of vectors.
+
+    CLIP embeddings are far from zero-mean, so hyperplanes through the origin
+    would put most vectors on the same side and skew the buckets. Once the
+    index holds ``MIN_CENTER_SAMPLES`` vectors they are hashed relative to the
+    mean of everything indexed, recomputed (and every vector rehashed) each
+    time the index doubles. Centering on fewer vectors would be worse than not
+    centering: a first burst of near-identical shots would be its own mean,
+    leaving only noise to hash. Buckets still larger than ``max_bucket_size``
+    are split on further hyperplanes before their pairs are compared.
+    """
+
+    MIN_CENTER_SAMPLES = 256
+    # Oversized buckets are split a few bits at a time: each extra bit costs
+    # recall, so add only as many as it takes to get under max_bucket_size
+    SPLIT_BITS = 2
+    MAX_SPLIT_DEPTH = 8
+
+    def __init__(
+        self,
+        dim: int,
+        num_tables: int = 16,
+        num_bits: int = 10,
+        seed: int = 0,
+        max_bucket_size: int = 1024,
+    ) -> None:
+        if num_bits > 63:
+            raise ValueError("num_bits must fit in a 64-bit bucket key")
+        self.dim = dim
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.max_bucket_size = max(2, max_bucket_size)
+        rng = np.random.default_rng(seed)
+        # (dim, tables * bits): every table's hyperplanes, projected in one matmul
+        self._planes = rng.standard_normal((dim, num_tables * num_bits)).astype(np.float32)
+        # Extra hyperplanes per split level for oversized buckets
+        self._split_planes = rng.standard_normal((self.MAX_SPLIT_DEPTH, dim, self.SPLIT_BITS)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(num_bits, dtype=np.int64))
+        self._center: Optional[np.ndarray] = None
+        self._centered_size = 0  # Number of vectors the center was computed from
+        self._buckets: list[defaultdict[int, list[int]]] = [defaultdict(list) for _ in range(num_tables)]
+        # Grown by doubling so incremental adds stay amortized O(1) per vector
+        self._vectors = np.empty((1024, dim), dtype=np.float32)
+        self._ids: list[int] = []
+        self._hashes: list[Optional[int]] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(
+        self,
+        ids: Iterable[int],
+        vectors: np.ndarray,
+        perceptual_hashes: Optional[Iterable[Optional[int]]] = None,
+    ) -> None:
+        """Index a batch of vectors (rows of ``vectors``) under their ids"""
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        hashes = list(perceptual_hashes) if perceptual_hashes is not None else [None] * len(ids)
+
+        offset = len(self._ids)
+        if offset + len(ids) > len(self._vectors):
+            capacity = max(offset + len(ids), 2 * len(self._vectors))
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            grown[:offset] = self._vectors[:offset]
+            self._vectors = grown
+        self._vectors[offset:offset + len(ids)] = vectors
+        self._ids.extend(ids)
+        self._hashes.extend(hashes)
+
+        size = len(self._ids)
+        if size >= max(self.MIN_CENTER_SAMPLES, 2 * self._centered_size):
+            # Amortized O(1) per vector, like the doubling buffer
+            self._center = self._vectors[:size].mean(axis=0)
+            self._centered_size = size
+            self._buckets = [defaultdict(list) for _ in range(self.num_tables)]
+            for start in range(0, size, 65_536):
+                self._insert(start, self._vectors[start:min(start + 65_536, size)])
+        else:
+            self._insert(offset, vectors)
+
+    def _insert(self, offset: int, vectors: np.ndarray) -> None:
+        """Put the vectors stored from position ``offset`` into their buckets"""
+        keys = self._bucket_keys(vectors)
+        for table, table_keys in enumerate(keys):
+            buckets = self._buckets[table]
+            for position, key in enumerate(table_keys.tolist()):
+                buckets[key].append(offset + position)
+
+    def duplicate_groups(
+        self, threshold: float, max_hash_distance: Optional[int] = None
+    ) -> list[tuple[list[int], float]]:
+        """Connected groups of ids whose cosine similarity is at least ``threshold``.
+
+        With ``max_hash_distance`` a pair must also be within that many bits of
+        perceptual hash when both hashes are known. Returns ``(ids, weakest
+        similarity that joined the group)`` per group of two or more.
+        """
+        parent = list(range(len(self._ids)))
+        weakest: dict[int, float] = {}
+
+        def find(node: int) -> int:
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for buckets in self._buckets:
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                for row_members, col_members, similarities in self._candidate_blocks(np.asarray(bucket)):
+                    rows, cols = np.nonzero(similarities >= threshold)
+                    for a, b in zip(row_members[rows].tolist(), col_members[cols].tolist()):
+                        if a >= b:
+                            # Self-pair, or the same pair seen the other way round
+                            continue
+                        if max_hash_distance is not None and not self._hashes_match(a, b, max_hash_distance):
+                            continue
+                        root_a, root_b = find(a), find(b)
+                        if root_a == root_b:
+                            # Already joined, e.g. through a collision in an earlier table
+                            continue
+                        similarity = float(self._vectors[a] @ self._vectors[b])
+                        parent[root_b] = root_a
+                        weakest[root_a] = min(similarity, weakest.get(root_a, 1.0), weakest.pop(root_b, 1.0))
+
+        groups: dict[int, list[int]] = defaultdict(list)
+        for node in range(len(self._ids)):
+            root = find(node)
+            if root in weakest:
+                groups[root].append(self._ids[node])
+        return [(sorted(ids), weakest[root]) for root, ids in groups.items()]
+
+    def _candidate_blocks(
+        self, members: np.ndarray, depth: int = 0
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """``(row members, column members, similarities)`` blocks covering every pair to compare.
+
+        Oversized buckets are split on the next level's hyperplanes; once those
+        run out (e.g. many identical images) the block is compared in row slices
+        so memory stays at ``max_bucket_size`` rows at a time.
+        """
+        if len(members) > self.max_bucket_size and depth < self.MAX_SPLIT_DEPTH:
+            projections = self._centered(self._vectors[members]) @ self._split_planes[depth]
+            keys = (projections > 0).astype(np.int64) @ self._bit_weights[:self.SPLIT_BITS]
+            order = np.argsort(keys, kind="stable")
+            boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+            for part in np.split(members[order], boundaries):
+                if len(part) > 1:
+                    yield from self._candidate_blocks(part, depth + 1)
+            return
+
+        block = self._vectors[members]
+        for start in range(0, len(members), self.max_bucket_size):
+            end = start + self.max_bucket_size
+            yield members[start:end], members, block[start:end] @ block.T
+
+    def _bucket_keys(self, vectors: np.ndarray) -> np.ndarray:
+        """(tables, n) bucket keys from the sign bits of each table's projections"""
+        signs = (self._centered(vectors) @ self._planes > 0).reshape(len(vectors), self.num_tables, self.num_bits)
+        return (signs.astype(np.int64) @ self._bit_weights).T
+
+    def _centered(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors if self._center is None else vectors - self._center
+
+    def _hashes_match(self, a: int, b: int, max_distance: int) -> bool:
+        hash_a, hash_b = self._hashes[a], self._hashes[b]
+        if hash_a is None or hash_b is None:
+            return True
+        return bin(hash_a ^ hash_b).count("1") <= max_distance
+
+
+def perceptual_hash(data: bytes, hash_size: int = 8) -> int:
+    """64-bit difference hash (dHash): brightness gradients of a tiny grayscale thumbnail.
+
+    Robust to re-encoding, resizing and small exposure changes; near-identical
+    shots differ in only a few bits.
+    """
+    with Image.open(BytesIO(data)) as img:
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(sum(1 << index for index, bit in enumerate(bits.tolist()) if bit))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ml.lsh import LSHIndex
+
+DIM = 512
+
+
+def clip_like(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Unit vectors sharing a large common direction, like CLIP image embeddings"""
+    shared = np.ones(DIM, dtype=np.float32) / np.sqrt(DIM)
+    vectors = rng.normal(size=(count, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors += 1.25 * shared
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def near_duplicates(rng: np.random.Generator, source: np.ndarray, count: int) -> np.ndarray:
+    """``count`` copies of ``source`` with pairwise cosine similarity above 0.98"""
+    copies = source + rng.normal(scale=0.004, size=(count, DIM)).astype(np.float32)
+    return copies / np.linalg.norm(copies, axis=1, keepdims=True)
+
+
+def grouped_ids(index: LSHIndex, threshold: float = 0.95) -> list[list[int]]:
+    return [ids for ids, _ in index.duplicate_groups(threshold)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_burst_added_as_first_batch_is_grouped(seed):
+    rng = np.random.default_rng(seed)
+    burst = near_duplicates(rng, clip_like(rng, 1)[0], 5)
+    index = LSHIndex(DIM, seed=seed)
+    index.add(range(5), burst)
+    assert grouped_ids(index) == [[0, 1, 2, 3, 4]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_duplicate_added_right_after_the_first_image_is_grouped(seed):
+    rng = np.random.default_rng(seed)
+    original, duplicate = near_duplicates(rng, clip_like(rng, 1)[0], 2)
+    index = LSHIndex(DIM, seed=seed)
+    index.add([10], original[None])
+    index.add([11], duplicate[None])
+    assert grouped_ids(index) == [[10, 11]]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_burst_is_found_across_recentering(seed):
+    rng = np.random.default_rng(seed)
+    burst = near_duplicates(rng, clip_like(rng, 1)[0], 5)
+    index = LSHIndex(DIM, seed=seed)
+    index.add(range(5), burst)
+    # Grows past MIN_CENTER_SAMPLES and doubles a few times, rehashing each time
+    for start in range(5, 2005, 100):
+        index.add(range(start, start + 100), clip_like(rng, 100))
+    assert [0, 1, 2, 3, 4] in grouped_ids(index)
+
+
+def test_centered_buckets_stay_small_for_skewed_embeddings():
+    rng = np.random.default_rng(0)
+    index = LSHIndex(DIM)
+    index.add(range(20_000), clip_like(rng, 20_000))
+    largest = max(len(members) for buckets in index._buckets for members in buckets.values())
+    assert largest < 200